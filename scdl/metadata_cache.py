@@ -0,0 +1,136 @@
+"""Persistent cache of SoundCloud API metadata"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class MetadataCache:
+    """Cache of JSON metadata stored in an SQLite database.
+
+    Entries expire after their time-to-live. Once the cached data grows beyond
+    `max_size` bytes, expired and then least recently used entries are evicted.
+    Feed watermarks and the metadata of downloaded tracks (used by `scdl retag`)
+    are stored separately and never expire.
+    """
+
+    def __init__(self, path: Path, ttl: float = DEFAULT_TTL, max_size: int = DEFAULT_MAX_SIZE):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._ttl = ttl
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        # allow other scdl processes to read while one is writing
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS watermarks (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tracks (id INTEGER PRIMARY KEY, filename TEXT NOT NULL, info TEXT NOT NULL)"
+        )
+        self._size = self._total_size()
+        self.hits = 0
+        self.misses = 0
+
+    def _total_size(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM metadata").fetchone()[0]
+
+    def get(self, key: str) -> Any:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM metadata WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE metadata SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        data = json.dumps(value, separators=(",", ":"))
+        now = time.time()
+        expires = now + (self._ttl if ttl is None else ttl)
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM metadata WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO metadata (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), expires, now),
+            )
+            self._size += len(data) - (old[0] if old else 0)
+            if self._size > self._max_size:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM metadata WHERE expires < ?", (now,))
+        self._size = self._total_size()
+        if self._size <= self._max_size:
+            return
+
+        # free some extra room so that eviction does not run on every insert
+        target = self._max_size * 0.9
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM metadata ORDER BY accessed"):
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM metadata WHERE key = ?", evicted)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM metadata WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM metadata WHERE key = ?", (key,))
+                self._size -= row[0]
+
+    def get_watermark(self, key: str) -> Any:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM watermarks WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_watermark(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks (key, value) VALUES (?, ?)",
+                (key, json.dumps(value, separators=(",", ":"))),
+            )
+
+    def get_track(self, track_id: int) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT info FROM tracks WHERE id = ?", (track_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_track(self, track_id: int, filename: str, info: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tracks (id, filename, info) VALUES (?, ?, ?)",
+                (track_id, filename, json.dumps(info, separators=(",", ":"))),
+            )
+
+    def iter_tracks(self) -> Iterator[tuple[int, str, dict]]:
+        """Yield the id, filename and metadata of every downloaded track"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, filename, info FROM tracks").fetchall()
+        for track_id, filename, info in rows:
+            yield track_id, filename, json.loads(info)
+
+    def stats(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
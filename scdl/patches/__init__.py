@@ -1,13 +1,19 @@
-from . import (
-    old_archive_ids,
-    sync_download_archive,
-    thumbnail_selection,
-    trim_filenames,
-)
+"""Patches for yt-dlp, applied by importing their modules"""
+
+import importlib
 
-__all__ = [
+_PATCHES = (
+    "existing_files",
+    "incremental_feed",
     "old_archive_ids",
+    "soundcloud_api_cache",
     "sync_download_archive",
     "thumbnail_selection",
     "trim_filenames",
-]
+)
+
+
+def apply_patches() -> None:
+    """Patch yt-dlp. This must happen before parsing yt-dlp options or creating a YoutubeDL."""
+    for name in _PATCHES:
+        importlib.import_module(f"{__name__}.{name}")
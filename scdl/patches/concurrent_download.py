@@ -0,0 +1,238 @@
+import collections
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from yt_dlp import YoutubeDL
+from yt_dlp.extractor.soundcloud import SoundcloudIE
+
+from scdl.patches.mutagen_postprocessor import MutagenPP
+
+_STAGES = ("extract", "download", "tag")
+# tagging the same file twice at the same time is serialized by one of these locks
+_FILE_LOCKS = 64
+
+
+class _SkippedError(Exception):
+    """Raised instead of running a stage which has not started before an earlier track failed"""
+
+
+class ConcurrentDownloadHelper:
+    """Process the tracks of a playlist in a pipeline of worker YoutubeDLs.
+
+    The playlist itself is still expanded by `ydl`, so playlist items, match filters,
+    archive checks and playlist indices behave exactly like a sequential download.
+    Each track then goes through three stages, which work on different tracks at the same time:
+    metadata extraction, downloading (and remuxing) and tagging by MutagenPP.
+    The stages are bounded so that extraction never runs far ahead of the downloads
+    and finished downloads do not pile up waiting to be tagged.
+    Tagging runs on its own pool of `tag_workers` threads, so that a download worker
+    can start the next track while large files are still being tagged.
+    Once a track fails (e.g. with --strict-playlist), dispatched tracks which have not started
+    downloading yet are skipped, while the downloads in progress are finished.
+    """
+
+    def __init__(self, scdl_args, ydl: YoutubeDL, create_worker: Callable[[], YoutubeDL]):
+        self._ydl = ydl
+        self._jobs = scdl_args.get("jobs") or 1
+        self._tag_workers = scdl_args.get("tag_workers") or 1
+        self._enabled = self._jobs > 1 or self._tag_workers > 1 or bool(scdl_args.get("pipeline"))
+        self._create_worker = create_worker
+        self._local = threading.local()
+        self._workers: list[YoutubeDL] = []
+        self._workers_lock = threading.Lock()
+        # tracks being extracted or downloaded, allowing one prefetched track per download worker
+        self._max_tracks = 2 * self._jobs
+        self._track_slots = threading.BoundedSemaphore(self._max_tracks)
+        self._max_tags = 2 * max(self._jobs, self._tag_workers)
+        self._tag_slots = threading.BoundedSemaphore(self._max_tags)
+        self._file_locks = [threading.Lock() for _ in range(_FILE_LOCKS)]
+        self._failures: list[BaseException] = []
+        self._executors: dict[str, ThreadPoolExecutor] = {}
+        self._stats_lock = threading.Lock()
+        self._queued: collections.Counter = collections.Counter()
+        self._count: collections.Counter = collections.Counter()
+        self._elapsed: collections.Counter = collections.Counter()
+        self._init()
+
+    def _init(self):
+        if not self._enabled:
+            return
+
+        self._executors = {
+            "extract": ThreadPoolExecutor(self._jobs, thread_name_prefix="scdl-extract"),
+            "download": ThreadPoolExecutor(self._jobs, thread_name_prefix="scdl-download"),
+            "tag": ThreadPoolExecutor(self._tag_workers, thread_name_prefix="scdl-tag"),
+        }
+        old_process_iterable_entry = self._ydl._YoutubeDL__process_iterable_entry
+
+        def process_iterable_entry(entry, download, extra_info):
+            self._raise_for_failures()
+            if not download or not self._is_track(entry):
+                # nested playlists are expanded in place so their tracks get dispatched too
+                return old_process_iterable_entry(entry, download, extra_info)
+
+            # wait for a free slot so failures abort the playlist as early as possible
+            self._track_slots.acquire()
+            if self._failures:
+                self._track_slots.release()
+                self._raise_for_failures()
+            extra_info = dict(extra_info)
+            extracted = self._submit("extract", self._extract_entry, entry, extra_info)
+            downloaded = self._submit("download", self._download_entry, extracted, extra_info)
+            downloaded.add_done_callback(lambda _: self._track_slots.release())
+            return entry
+
+        self._ydl._YoutubeDL__process_iterable_entry = process_iterable_entry
+
+    @staticmethod
+    def _is_track(entry: dict) -> bool:
+        if entry.get("_type", "video") == "video":
+            return True
+        return entry.get("ie_key") == SoundcloudIE.ie_key()
+
+    def _get_worker(self) -> YoutubeDL:
+        worker = getattr(self._local, "ydl", None)
+        if worker is None:
+            worker = self._create_worker()
+            # share archive state and hooks with the main downloader
+            worker.archive = self._ydl.archive
+            for hook in self._ydl._progress_hooks:
+                worker.add_progress_hook(hook)
+            for hook in self._ydl._postprocessor_hooks:
+                worker.add_postprocessor_hook(hook)
+            for pp in worker._pps["post_process"]:
+                if isinstance(pp, MutagenPP):
+                    pp.defer_to(self._submit_tagging)
+            with self._workers_lock:
+                self._workers.append(worker)
+            self._local.ydl = worker
+        return worker
+
+    def _submit(self, stage: str, func: Callable, *args) -> Future:
+        with self._stats_lock:
+            self._queued[stage] += 1
+            queued = ", ".join(f"{s}={self._queued[s]}" for s in _STAGES)
+        self._ydl.write_debug(f"[pipeline] Queued: {queued}")
+        future = self._executors[stage].submit(self._run_stage, stage, func, *args)
+        if stage != "extract":
+            # extraction failures are raised again by the download stage
+            future.add_done_callback(self._stage_done)
+        return future
+
+    def _run_stage(self, stage: str, func: Callable, *args):
+        try:
+            # wait for the previous stage, raising its failures here in playlist order
+            args = tuple(arg.result() if isinstance(arg, Future) else arg for arg in args)
+            if self._failures and stage != "tag":
+                # e.g. with --strict-playlist, tracks dispatched after the failed one are not downloaded,
+                # while tracks which were already downloaded are still tagged
+                raise _SkippedError(f"Skipped after an earlier track failed: {self._failures[0]}")
+        except BaseException:
+            with self._stats_lock:
+                self._queued[stage] -= 1
+            raise
+
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self._queued[stage] -= 1
+                self._count[stage] += 1
+                self._elapsed[stage] += elapsed
+            self._ydl.write_debug(f"[pipeline] {stage.capitalize()} took {elapsed:.2f}s")
+
+    def _stage_done(self, future: Future):
+        if future.exception() is not None:
+            self._failures.append(future.exception())
+
+    def _extract_entry(self, entry: dict, extra_info: dict):
+        if entry.get("_type", "video") not in ("url", "url_transparent"):
+            return entry
+
+        worker = self._get_worker()
+        info = worker.extract_info(
+            entry["url"], download=False, ie_key=entry.get("ie_key"), extra_info=extra_info, process=False
+        )
+        if not info or entry["_type"] == "url":
+            return info
+
+        # use the information from the playlist, like YoutubeDL.process_ie_result does
+        result = info.copy()
+        exempted_fields = {"_type", "url", "ie_key", "id", "extractor", "extractor_key"}
+        result.update({k: v for k, v in entry.items() if v is not None and k not in exempted_fields})
+        if result.get("_type") == "url":
+            result["_type"] = "url_transparent"
+        return result
+
+    def _download_entry(self, info: dict | None, extra_info: dict):
+        if not info:
+            return None
+
+        worker = self._get_worker()
+        return worker._YoutubeDL__process_iterable_entry(info, True, extra_info)
+
+    def _submit_tagging(self, func: Callable, filename: str, *args):
+        # block the download worker if tagging falls too far behind
+        self._tag_slots.acquire()
+        future = self._submit("tag", self._tag_file, func, filename, *args)
+        future.add_done_callback(lambda _: self._tag_slots.release())
+
+    def _tag_file(self, func: Callable, filename: str, *args):
+        # e.g. a track linked into several playlists by --dedupe-store
+        with self._file_locks[hash(filename) % _FILE_LOCKS]:
+            return func(filename, *args)
+
+    def _raise_for_failures(self):
+        if self._failures:
+            raise self._failures[0]
+
+    def wait(self):
+        """Wait until all tracks dispatched so far have been downloaded and tagged"""
+        if not self._enabled:
+            return
+
+        # every in-flight track holds a slot until it is done
+        for slots, count in ((self._track_slots, self._max_tracks), (self._tag_slots, self._max_tags)):
+            for _ in range(count):
+                slots.acquire()
+            for _ in range(count):
+                slots.release()
+
+        with self._workers_lock:
+            for worker in self._workers:
+                if worker._download_retcode:
+                    self._ydl._download_retcode = worker._download_retcode
+                    worker._download_retcode = 0
+
+    def post_download(self):
+        if not self._enabled:
+            return
+
+        self.wait()
+        with self._stats_lock:
+            for stage in _STAGES:
+                if self._count[stage]:
+                    self._ydl.write_debug(
+                        f"[pipeline] {stage.capitalize()}: {self._count[stage]} tracks "
+                        f"in {self._elapsed[stage]:.2f}s ({self._elapsed[stage] / self._count[stage]:.2f}s/track)"
+                    )
+            self._count.clear()
+            self._elapsed.clear()
+
+        failures, self._failures = self._failures, []
+        if failures:
+            raise failures[0]
+
+    def close(self):
+        if not self._enabled or not self._executors:
+            return
+
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+        self._executors = {}
+        for worker in self._workers:
+            worker.close()
@@ -0,0 +1,70 @@
+import os
+from pathlib import Path
+
+from yt_dlp.postprocessor.common import PostProcessor
+
+from scdl.patches.switch_outtmpl_preprocessor import OUTTMPL_KEY, get_outtmpl
+
+# name of each track in the store
+_STORE_OUTTMPL = "%(id)s.%(ext)s"
+# set on the info of tracks downloaded into the store, and stored with it by MutagenPP for scdl retag
+STORED_KEY = "scdl_dedupe_store"
+
+
+def remove_playlist_tags(info: dict) -> None:
+    """Leave out the tags which depend on the playlist, for a file shared by several playlists"""
+    for meta in ("track", "album_artist", "album"):
+        info[f"meta_{meta}"] = None
+
+
+class DedupeStorePP(PostProcessor):
+    """Download each track once into a store directory, named by its id.
+
+    The filename the track would have been downloaded to is kept for DedupeLinkPP.
+    Since the stored file is shared by every playlist containing the track,
+    tags which depend on the playlist (album, album artist and track number) are not written.
+    """
+
+    def __init__(self, store: Path, downloader=None):
+        super().__init__(downloader)
+        self._store = store
+
+    def run(self, info):
+        info["__scdl_link_outtmpl"] = get_outtmpl(self._downloader, info)
+        info[OUTTMPL_KEY] = (self._store / _STORE_OUTTMPL).as_posix()
+        info[STORED_KEY] = True
+        remove_playlist_tags(info)
+        return [], info
+
+
+class DedupeLinkPP(PostProcessor):
+    """Link a track of the store to the filename it would have been downloaded to.
+
+    Hardlinks are used where possible, and symlinks otherwise (e.g. when the store is on another filesystem).
+    """
+
+    def run(self, info):
+        link_outtmpl = info.get("__scdl_link_outtmpl")
+        if not link_outtmpl:
+            return [], info
+
+        target = info["filepath"]
+        link = self._downloader.prepare_filename(info, outtmpl=link_outtmpl)
+        if os.path.lexists(link):
+            if os.path.exists(link) and os.path.samefile(target, link):
+                return [], info
+            if not self.get_param("overwrites"):
+                self.to_screen(f'"{link}" already exists and is not linked to the store')
+                return [], info
+
+        os.makedirs(os.path.dirname(link) or ".", exist_ok=True)
+        tmp_link = f"{link}.part"
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        try:
+            os.link(target, tmp_link)
+        except OSError:
+            os.symlink(os.path.abspath(target), tmp_link)
+        os.replace(tmp_link, link)
+        self.to_screen(f'Linked "{link}" to "{target}"')
+        return [], info
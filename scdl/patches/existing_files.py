@@ -0,0 +1,153 @@
+# answer which files exist from an index of the download directory instead of the filesystem
+import os
+
+from yt_dlp import YoutubeDL
+from yt_dlp.downloader.common import FileDownloader
+from yt_dlp.utils import orderedSet
+
+
+class FileIndex:
+    """Files below a directory, scanned once with a single listing of each directory.
+
+    yt-dlp checks several candidate filenames of every track, each a round trip on network
+    filesystems, so with the index a run finding nothing new barely touches the filesystem.
+    Files written or deleted by scdl are added and removed as they go. Paths in directories
+    which were not scanned (e.g. outside of the directory, or below a symlink) are checked
+    on the filesystem as usual.
+    """
+
+    def __init__(self, root: str):
+        self._root = self._key(root)
+        self._dirs: set[str] = set()
+        # set.add and set.discard are atomic, so the download workers can share an index
+        self._files: set[str] = set()
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def scan(self, directory: str | None = None) -> int:
+        """Add the files below directory (default: the whole index), returns the number of files found"""
+        top = self._key(directory) if directory else self._root
+        if top != self._root and not top.startswith(os.path.join(self._root, "")):
+            return 0
+
+        found = 0
+        for dirpath, _, filenames in os.walk(top):
+            dirpath = os.path.normcase(dirpath)
+            self._files.update(os.path.join(dirpath, os.path.normcase(filename)) for filename in filenames)
+            self._dirs.add(dirpath)
+            found += len(filenames)
+        return found
+
+    def has_dir(self, directory: str) -> bool:
+        return self._key(directory) in self._dirs
+
+    def exists(self, path: str) -> bool:
+        key = self._key(path)
+        if os.path.dirname(key) not in self._dirs:
+            return os.path.exists(path)
+        return key in self._files
+
+    def add(self, path: str) -> None:
+        key = self._key(path)
+        if os.path.dirname(key) in self._dirs:
+            self._files.add(key)
+
+    def discard(self, path: str) -> None:
+        self._files.discard(self._key(path))
+
+
+def _get_index(ydl: YoutubeDL) -> FileIndex | None:
+    return ydl.params.get("scdl_file_index")
+
+
+old_existing_file = YoutubeDL.existing_file
+
+
+def existing_file(self, filepaths, *, default_overwrite=True):
+    index = _get_index(self)
+    if index is None:
+        return old_existing_file(self, filepaths, default_overwrite=default_overwrite)
+
+    existing_files = [file for file in orderedSet(filepaths) if index.exists(file)]
+    if existing_files and not self.params.get("overwrites", default_overwrite):
+        return existing_files[0]
+
+    for file in existing_files:
+        self.report_file_delete(file)
+        os.remove(file)
+        index.discard(file)
+    return None
+
+
+old_ensure_dir_exists = YoutubeDL._ensure_dir_exists
+
+
+def _ensure_dir_exists(self, path):
+    index = _get_index(self)
+    if index is None:
+        return old_ensure_dir_exists(self, path)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    if index.has_dir(directory):
+        return True
+    if not old_ensure_dir_exists(self, path):
+        return False
+    # e.g. the folder of a new playlist
+    index.scan(directory)
+    return True
+
+
+old_delete_downloaded_files = YoutubeDL._delete_downloaded_files
+
+
+def _delete_downloaded_files(self, *files_to_delete, **kwargs):
+    old_delete_downloaded_files(self, *files_to_delete, **kwargs)
+    index = _get_index(self)
+    if index is not None:
+        for filename in filter(None, files_to_delete):
+            index.discard(filename)
+
+
+old_post_process = YoutubeDL.post_process
+
+
+def post_process(self, filename, info, files_to_move=None):
+    info = old_post_process(self, filename, info, files_to_move)
+    index = _get_index(self)
+    if index is not None and info.get("filepath"):
+        # e.g. the remuxed file
+        index.add(info["filepath"])
+    return info
+
+
+old_download = FileDownloader.download
+
+
+def download(self, filename, info_dict, subtitle=False):
+    index = _get_index(self.ydl)
+    if index is None or not isinstance(filename, str) or filename == "-":
+        return old_download(self, filename, info_dict, subtitle)
+
+    if index.exists(filename) and (
+        not self.params.get("overwrites", True)
+        or (self.params.get("continuedl", True) and not self.params.get("nopart", False))
+    ):
+        # same as FileDownloader.download, without the size of the file
+        self.report_file_already_downloaded(filename)
+        self._hook_progress({"filename": filename, "status": "finished"}, info_dict)
+        self._finish_multiline_status()
+        return True, False
+
+    result = old_download(self, filename, info_dict, subtitle)
+    if result[0]:
+        index.add(filename)
+    return result
+
+
+YoutubeDL.existing_file = existing_file
+YoutubeDL._ensure_dir_exists = _ensure_dir_exists
+YoutubeDL._delete_downloaded_files = _delete_downloaded_files
+YoutubeDL.post_process = post_process
+FileDownloader.download = download
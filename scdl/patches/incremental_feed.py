@@ -0,0 +1,91 @@
+# stop paging through user feeds once items seen in a previous run are reached
+import re
+
+from yt_dlp import YoutubeDL
+from yt_dlp.extractor.soundcloud import SoundcloudPagedPlaylistBaseIE
+
+# tracks, likes, reposts and all (stream) feeds of a user, newest items first
+_FEED_RE = re.compile(r"https://api-v2\.soundcloud\.com/(?:stream/users/\d+(?:/reposts)?|users/\d+/(?:tracks|likes))")
+# more than one id, so that deleting the newest item does not cause a full scan
+_WATERMARK_SIZE = 10
+
+
+class IncrementalFeedHelper:
+    """Only list the items added to user feeds since the last successful run.
+
+    The ids of the newest items of each feed are stored in the metadata cache as its watermark,
+    and the next run stops paginating as soon as it reaches one of them.
+    """
+
+    def __init__(self, scdl_args, ydl: YoutubeDL, cache):
+        self._ydl = ydl
+        self._cache = cache
+        self._enabled = bool(scdl_args.get("incremental"))
+        self._full_rescan = bool(scdl_args.get("full_rescan"))
+        self._sync = bool(scdl_args.get("sync"))
+        self._pending: dict[str, list[str]] = {}
+        self._init()
+
+    def _init(self):
+        if not self._enabled:
+            return
+
+        if self._sync:
+            # --sync removes the files of tracks which are not listed
+            self._ydl.report_warning("--incremental cannot be used with --sync, listing all items")
+            self._enabled = False
+        elif self._cache is None:
+            self._ydl.report_warning("--incremental requires the metadata cache, listing all items")
+            self._enabled = False
+        else:
+            self._ydl.params["scdl_feed_watermarks"] = self
+
+    def get(self, feed_url: str) -> list[str] | None:
+        """Return the ids to stop at, or None if the feed is always listed in full"""
+        if not _FEED_RE.fullmatch(feed_url):
+            return None
+        if self._full_rescan:
+            return []
+        return self._cache.get_watermark(f"feed:{feed_url}") or []
+
+    def update(self, feed_url: str, newest: list[str], known: list[str]):
+        ids = list(dict.fromkeys(newest + known))[:_WATERMARK_SIZE]
+        self._pending[feed_url] = ids
+
+    def post_download(self):
+        if not self._enabled:
+            return
+
+        pending, self._pending = self._pending, {}
+        # items of a failed download have to be listed again next time
+        if self._ydl._download_retcode:
+            return
+        for feed_url, ids in pending.items():
+            self._cache.set_watermark(f"feed:{feed_url}", ids)
+
+
+old_entries = SoundcloudPagedPlaylistBaseIE._entries
+
+
+def _entries(self, url, playlist_id):
+    feeds = self.get_param("scdl_feed_watermarks")
+    known = feeds.get(url) if feeds else None
+    if known is None:
+        yield from old_entries(self, url, playlist_id)
+        return
+
+    newest = []
+    for entry in old_entries(self, url, playlist_id):
+        id_ = entry and entry.get("id")
+        if id_ in known:
+            self.to_screen(
+                f"{playlist_id}: Reached items listed in a previous run. Use --full-rescan to list all items"
+            )
+            break
+        if id_ and len(newest) < _WATERMARK_SIZE:
+            newest.append(id_)
+        yield entry
+    feeds.update(url, newest, known)
+
+
+SoundcloudPagedPlaylistBaseIE._entries = _entries
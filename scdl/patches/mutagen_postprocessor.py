@@ -3,8 +3,10 @@ import base64
 import collections
 import contextlib
 import functools
+import hashlib
 import os
 import re
+import threading
 from typing import ClassVar
 
 import mutagen
@@ -25,14 +27,70 @@ from mutagen import (
     wave,
 )
 from yt_dlp.compat import imghdr
+from yt_dlp.networking.common import Request
+from yt_dlp.networking.exceptions import network_exceptions
 from yt_dlp.postprocessor.common import PostProcessor
 from yt_dlp.utils import PostProcessingError, date_from_str, variadic
 
+# total size of the artwork kept in memory
+_ARTWORK_CACHE_SIZE = 32 * 1024 * 1024
+
 
 class MutagenPostProcessorError(PostProcessingError):
     pass
 
 
+class _ArtworkCache:
+    """Artwork shared by all MutagenPPs, so tracks with the same cover only download it once"""
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._size = 0
+        self._entries: collections.OrderedDict[str, bytes] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str, fetch) -> bytes | None:
+        with self._lock:
+            data = self._entries.get(url)
+            if data is not None:
+                self._entries.move_to_end(url)
+                return data
+
+        data = fetch(url)
+        if data is None or len(data) > self._max_size:
+            return data
+
+        with self._lock:
+            if url not in self._entries:
+                self._entries[url] = data
+                self._size += len(data)
+            while self._size > self._max_size:
+                _, old = self._entries.popitem(last=False)
+                self._size -= len(old)
+        return data
+
+
+_artwork_cache = _ArtworkCache(_ARTWORK_CACHE_SIZE)
+_stats_lock = threading.Lock()
+
+# fields of the info dict which are not needed to tag the track again
+_UNSTORED_FIELDS = frozenset(("url", "filepath", "filename"))
+
+# e.g. meta_album, or meta1_album for the first stream only
+_META_RE = re.compile(r"meta(?P<i>\d+)?_(?P<key>.+)")
+
+# opened directly instead of probing the file against every format mutagen supports
+_FILE_TYPES = {
+    "aiff": aiff.AIFF,
+    "flac": flac.FLAC,
+    "m4a": mp4.MP4,
+    "mp3": mp3.MP3,
+    "ogg": oggvorbis.OggVorbis,
+    "opus": oggopus.OggOpus,
+    "wav": wave.WAVE,
+}
+
+
 class MutagenPP(PostProcessor):
     _MUTAGEN_SUPPORTED_EXTS = ("alac", "aiff", "flac", "mp3", "m4a", "ogg", "opus", "vorbis", "wav")
     _VORBIS_METADATA: ClassVar[dict[str, str]] = {
@@ -58,6 +116,11 @@ class MutagenPP(PostProcessor):
         "TCOM": "composer",
         "TPOS": "disc",
     }
+    # frame class, metadata key and whether it is a URL frame, looked up once
+    _ID3_FRAMES: ClassVar[tuple[tuple[type, str, bool], ...]] = tuple(
+        (getattr(id3, file_key), meta_key, issubclass(getattr(id3, file_key), id3.UrlFrame))
+        for file_key, meta_key in _ID3_METADATA.items()
+    )
     _MP4_METADATA: ClassVar[dict[str, str]] = {
         "\251ART": "artist",
         "\251nam": "title",
@@ -73,9 +136,16 @@ class MutagenPP(PostProcessor):
         "tven": "episode_sort",
     }
 
-    def __init__(self, post_overwrites: bool, downloader=None):
+    def __init__(self, post_overwrites: bool, downloader=None, padding: int | None = None):
         super().__init__(downloader)
         self._post_overwrites = post_overwrites
+        # space reserved after the tags, so that later changes are written in place
+        self._padding = padding
+        self._defer = None
+
+    def defer_to(self, submit):
+        """Hand off writing the tags to submit(func, *args), e.g. to run on another thread"""
+        self._defer = submit
 
     def _get_flac_pic(self, thumbnail: dict) -> flac.Picture:
         pic = flac.Picture()
@@ -126,9 +196,8 @@ class MutagenPP(PostProcessor):
             add("comment", "description")
             metadata["common"].pop("synopsis", None)
 
-        meta_regex = rf"{re.escape(meta_prefix)}(?P<i>\d+)?_(?P<key>.+)"
         for key, value in info.items():
-            mobj = re.fullmatch(meta_regex, key)
+            mobj = _META_RE.fullmatch(key) if key.startswith(meta_prefix) else None
             if value is not None and mobj:
                 metadata[mobj.group("i") or "common"][mobj.group("key")] = value.replace("\0", "")
         return metadata
@@ -150,6 +219,7 @@ class MutagenPP(PostProcessor):
 
         if meta.get("thumbnail"):
             pic = self._get_flac_pic(meta["thumbnail"])
+            file.clear_pictures()
             file.add_picture(pic)
 
     @_assemble_metadata.register(oggvorbis.OggVorbis)
@@ -177,43 +247,48 @@ class MutagenPP(PostProcessor):
     @_assemble_metadata.register(mp3.MP3)
     @_assemble_metadata.register(wave.WAVE)
     def _(self, file: wave.WAVE, meta: dict) -> None:
-        for file_key, meta_key in self._ID3_METADATA.items():
+        if file.tags is None:
+            file.add_tags()
+        # frames are added by their hash key (e.g. "APIC:Cover (front)"), replacing the existing ones
+        for id3_class, meta_key, is_url in self._ID3_FRAMES:
             if meta.get(meta_key):
-                id3_class = getattr(id3, file_key)
-                if issubclass(id3_class, id3.UrlFrame):
-                    file[file_key] = id3_class(url=meta[meta_key])
+                if is_url:
+                    file.tags.add(id3_class(url=meta[meta_key]))
                 else:
-                    file[file_key] = id3_class(encoding=id3.Encoding.UTF8, text=meta[meta_key])
+                    file.tags.add(id3_class(encoding=id3.Encoding.UTF8, text=meta[meta_key]))
 
         if meta.get("date"):
             # ID3 uses ISO 8601 format YYYY-MM-DD
             date = date_from_str(meta["date"])
-            file["TDRC"] = id3.TDRC(encoding=id3.Encoding.UTF8, text=date.strftime("%Y-%m-%d"))
+            file.tags.add(id3.TDRC(encoding=id3.Encoding.UTF8, text=date.strftime("%Y-%m-%d")))
 
         if meta.get("thumbnail"):
-            file["APIC"] = id3.APIC(
-                encoding=3,
-                mime=f'image/{meta["thumbnail"]["type"]}',
-                type=3,
-                desc="Cover (front)",
-                data=meta["thumbnail"]["data"],
+            file.tags.add(
+                id3.APIC(
+                    encoding=3,
+                    mime=f'image/{meta["thumbnail"]["type"]}',
+                    type=3,
+                    desc="Cover (front)",
+                    data=meta["thumbnail"]["data"],
+                )
             )
 
     @_assemble_metadata.register(mp4.MP4)
     def _(self, file: mp4.MP4, meta: dict) -> None:
+        # values are lists, like when mutagen loads them, so unchanged tags compare equal
         for file_key, meta_key in self._MP4_METADATA.items():
             if meta.get(meta_key):
-                file[file_key] = meta[meta_key]
+                file[file_key] = [meta[meta_key]]
 
         if meta.get("date"):
             # no standard but iTunes uses YYYY-MM-DD format
             date = date_from_str(meta["date"])
-            file["\251day"] = date.strftime("%Y-%m-%d")
+            file["\251day"] = [date.strftime("%Y-%m-%d")]
 
         if meta.get("purl"):
             # https://getmusicbee.com/forum/index.php?topic=39759.0
-            file["----:com.apple.iTunes:WWWAUDIOFILE"] = meta["purl"].encode()
-            file["purl"] = meta["purl"]
+            file["----:com.apple.iTunes:WWWAUDIOFILE"] = [mp4.MP4FreeForm(meta["purl"].encode())]
+            file["purl"] = [meta["purl"]]
 
         if meta.get("track"):
             with contextlib.suppress(ValueError):
@@ -223,16 +298,13 @@ class MutagenPP(PostProcessor):
             f = {"jpeg": mp4.MP4Cover.FORMAT_JPEG, "png": mp4.MP4Cover.FORMAT_PNG}
             file["covr"] = [mp4.MP4Cover(meta["thumbnail"]["data"], f[meta["thumbnail"]["type"]])]
 
-    def _get_thumbnail(self, info: dict):
-        if not info.get("thumbnails"):
-            self.to_screen("There aren't any thumbnails to embed")
-            return None
-
-        idx = next((-i for i, t in enumerate(info["thumbnails"][::-1], 1) if t.get("filepath")), None)
+    def _read_thumbnail_file(self, info: dict) -> bytes | None:
+        # only written by yt-dlp if asked to with --yt-dlp-args
+        thumbnails = info.get("thumbnails") or []
+        idx = next((-i for i, t in enumerate(thumbnails[::-1], 1) if t.get("filepath")), None)
         if idx is None:
-            self.to_screen("There are no thumbnails on disk")
             return None
-        thumbnail_filename = info["thumbnails"][idx]["filepath"]
+        thumbnail_filename = thumbnails[idx]["filepath"]
         if not os.path.exists(thumbnail_filename):
             self.report_warning("Skipping embedding the thumbnail because the file is missing.")
             return None
@@ -244,6 +316,36 @@ class MutagenPP(PostProcessor):
             thumbnail_filename,
             info=info,
         )
+        return thumb_data
+
+    def _download_thumbnail(self, url: str, headers: dict | None = None) -> bytes | None:
+        try:
+            with self._downloader.urlopen(Request(url, headers=headers)) as res:
+                return res.read()
+        except network_exceptions as err:
+            self.report_warning(f"Unable to download thumbnail {url}: {err}")
+            return None
+
+    def _fetch_thumbnail(self, info: dict) -> bytes | None:
+        if not info.get("thumbnails"):
+            self.to_screen("There aren't any thumbnails to embed")
+            return None
+
+        # the preferred thumbnail is sorted last
+        for thumbnail in info["thumbnails"][::-1]:
+            if not thumbnail.get("url"):
+                continue
+            fetch = functools.partial(self._download_thumbnail, headers=thumbnail.get("http_headers"))
+            thumb_data = _artwork_cache.get(thumbnail["url"], fetch)
+            if thumb_data is not None:
+                return thumb_data
+        return None
+
+    def _get_thumbnail(self, info: dict, thumb_data: bytes | None):
+        if thumb_data is None:
+            thumb_data = self._fetch_thumbnail(info)
+        if thumb_data is None:
+            return None
 
         type_ = imghdr.what(h=thumb_data)
         if not type_:
@@ -256,11 +358,31 @@ class MutagenPP(PostProcessor):
 
         return {"data": thumb_data, "type": type_}
 
+    def _store_track(self, info: dict) -> None:
+        # used by `scdl retag` to tag the file again without downloading its metadata
+        cache = self.get_param("scdl_metadata_cache")
+        if cache is None or not str(info.get("id")).isdecimal():
+            return
+        stored = {
+            key: value
+            for key, value in info.items()
+            if key not in _UNSTORED_FIELDS
+            and not key.startswith(("_", "meta"))
+            and (
+                isinstance(value, (str, int, float))
+                or (isinstance(value, list) and all(isinstance(v, str) for v in value))
+            )
+        }
+        cache.set_track(int(info["id"]), os.path.abspath(info["filepath"]), stored)
+
     def run(self, info: dict):
-        thumbnail = self._get_thumbnail(info)
+        if info["__real_download"]:
+            self._store_track(info)
+        thumb_data = self._read_thumbnail_file(info)
         if not info["__real_download"] and not self._post_overwrites:
             return [], info
 
+        thumbnail = self._get_thumbnail(info, thumb_data)
         filename = info["filepath"]
         metadata = self._get_metadata_dict(info)["common"]
 
@@ -275,11 +397,75 @@ class MutagenPP(PostProcessor):
             raise MutagenPostProcessorError(f'Unsupported file extension: {info["ext"]}')
 
         self.to_screen(f'Adding metadata to "{filename}"')
+        # the file must not be moved after this postprocessor while it is being tagged
+        # files which were not downloaded again are only stored if their tags changed, e.g. with --force-metadata
+        stored_info = None if info["__real_download"] else dict(info)
+        if self._defer is not None and not (self.get_param("paths") or {}).get("temp"):
+            self._defer(self._embed_metadata_or_report, filename, metadata, stored_info)
+        elif self._embed_metadata(filename, metadata) and stored_info is not None:
+            self._store_track(stored_info)
+
+        return [], info
+
+    @staticmethod
+    def _get_tags(file: FileType) -> dict:
+        # vorbis comments iterate over (key, value) pairs, not keys
+        tags = {key: file.tags[key] for key in file.tags.keys()} if file.tags is not None else {}  # noqa: SIM118
+        for i, pic in enumerate(getattr(file, "pictures", ())):
+            tags[f"picture:{i}"] = hashlib.sha256(pic.write()).digest()
+        return tags
+
+    def _count(self, key: str) -> None:
+        stats = self.get_param("scdl_tag_stats")
+        if stats is not None:
+            with _stats_lock:
+                stats[key] += 1
+
+    @staticmethod
+    def _open(filename: str) -> FileType | None:
+        file_type = _FILE_TYPES.get(os.path.splitext(filename)[1][1:].lower())
+        if file_type is not None:
+            with contextlib.suppress(mutagen.MutagenError):
+                return file_type(filename)
+        # e.g. an .ogg file containing opus
+        return mutagen.File(filename)
+
+    def _embed_metadata(self, filename: str, metadata: dict) -> bool:
+        """Write the tags of a file, returns whether it was changed"""
         try:
-            f = mutagen.File(filename)
+            f = self._open(filename)
+            old_tags = self._get_tags(f)
             self._assemble_metadata(f, metadata)
-            f.save()
+            # do not rewrite files whose tags are already up to date, e.g. with --force-metadata
+            if self._get_tags(f) == old_tags:
+                self.to_screen(f'Metadata of "{filename}" is already up to date')
+                self._count("unchanged")
+                return False
+            rewritten = []
+            f.save(padding=functools.partial(self._get_padding, rewritten))
         except Exception as err:
             raise MutagenPostProcessorError("Unable to embed metadata") from err
-
-        return [], info
+        if rewritten and old_tags:
+            self.to_screen(f'Tags of "{filename}" did not fit into its padding, rewrote the whole file')
+            self._count("rewritten")
+        self._count("updated")
+        return True
+
+    def _get_padding(self, rewritten: list, info: mutagen.PaddingInfo) -> int:
+        """Padding to leave after the tags, the file is only rewritten if the tags do not fit in place"""
+        if info.padding < 0:
+            rewritten.append(True)
+        if self._padding is None:
+            return info.get_default_padding()
+        # keep any existing padding as it is, growing it would rewrite the file as well
+        return info.padding if info.padding >= 0 else self._padding
+
+    def _embed_metadata_or_report(self, filename: str, metadata: dict, stored_info: dict | None = None) -> None:
+        try:
+            changed = self._embed_metadata(filename, metadata)
+        except MutagenPostProcessorError as err:
+            # same as YoutubeDL.process_info does for errors raised while postprocessing
+            self._downloader.report_error(f"Postprocessing: {err}")
+            return
+        if changed and stored_info is not None:
+            self._store_track(stored_info)
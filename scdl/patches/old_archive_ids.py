@@ -1,13 +1,44 @@
+import errno
+
 from yt_dlp import YoutubeDL
+from yt_dlp.utils import is_path_like, locked_file
+
+
+def load_download_archive(ydl: YoutubeDL, fn) -> set[str]:
+    """Load an archive file, turning the bare ids written by old versions of scdl into "soundcloud <id>"
+
+    Every id is then checked with a single set lookup by YoutubeDL.in_download_archive.
+    """
+    ydl.write_debug(f"Loading archive file {fn!r}")
+    try:
+        with locked_file(fn, "r", encoding="utf-8") as archive_file:
+            archive = {line.strip() for line in archive_file}
+    except OSError as ioe:
+        if ioe.errno != errno.ENOENT:
+            raise
+        return set()
+
+    archive.discard("")
+    old_ids = {id_ for id_ in archive if " " not in id_}
+    if old_ids:
+        archive -= old_ids
+        archive.update(f"soundcloud {id_}" for id_ in old_ids)
+    return archive
+
+
+old_init = YoutubeDL.__init__
 
 
-def in_download_archive(self, info_dict):
-    if not self.archive:
-        return False
+def init_patched(self, params=None, auto_init=True):
+    fn = (params or {}).get("download_archive")
+    if not is_path_like(fn):
+        old_init(self, params, auto_init)
+        return
 
-    vid_ids = [self._make_archive_id(info_dict)]
-    vid_ids.extend(info_dict.get("_old_archive_ids") or [])
-    return any(id_ in self.archive for id_ in vid_ids) or any(id_.split()[1] in self.archive for id_ in vid_ids if id_)
+    # load the archive ourselves instead of letting yt-dlp read it as is
+    old_init(self, {**params, "download_archive": None}, auto_init)
+    self.params["download_archive"] = fn
+    self.archive = load_download_archive(self, fn)
 
 
-YoutubeDL.in_download_archive = in_download_archive
+YoutubeDL.__init__ = init_patched
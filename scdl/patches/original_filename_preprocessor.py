@@ -1,10 +1,22 @@
+import collections
 import email.message
+import email.utils
+import threading
 import urllib.parse
 from pathlib import Path
 
 from yt_dlp.networking.common import Request, Response
+from yt_dlp.networking.exceptions import HTTPError
 from yt_dlp.postprocessor.common import PostProcessor
 
+from scdl.patches.switch_outtmpl_preprocessor import OUTTMPL_KEY, get_outtmpl
+
+# original filenames of the tracks seen recently, None if the track has none. Bounded since
+# `scdl serve` runs for a long time, tracks seen earlier are found in the metadata cache
+_MAX_FILENAMES = 1024
+_filenames: collections.OrderedDict[str, str | None] = collections.OrderedDict()
+_filenames_lock = threading.Lock()
+
 
 def _parse_header(content_disposition):
     if not content_disposition:
@@ -15,18 +27,63 @@ def _parse_header(content_disposition):
 
 
 class OriginalFilenamePP(PostProcessor):
+    """Name the original file download like the file uploaded to SoundCloud.
+
+    The filename is read from the Content-Disposition header of a HEAD request, or of a
+    request for the first byte if HEAD is not allowed, so the file is only downloaded once.
+    Filenames are kept per track, and in the metadata cache across runs.
+    """
+
     def run(self, info):
         for format in info.get("formats", ()):
             if format.get("format_id") == "download":
-                res: Response = self._downloader.urlopen(Request(format["url"], headers=format["http_headers"]))
-                params = _parse_header(res.get_header("content-disposition"))
-                if "filename" not in params:
+                filename = self._get_filename(info["id"], format)
+                if not filename:
                     break
-                filename = urllib.parse.unquote(params["filename"][-1], encoding="utf-8")
-                old_outtmpl = self._downloader.params["outtmpl"]["default"]
-                self._downloader.params["outtmpl"]["default"] = (
-                    Path(old_outtmpl).with_name(filename).with_suffix(".%(ext)s").as_posix()
-                )
+                old_outtmpl = get_outtmpl(self._downloader, info)
+                info[OUTTMPL_KEY] = Path(old_outtmpl).with_name(filename).with_suffix(".%(ext)s").as_posix()
                 break
 
         return [], info
+
+    def _get_filename(self, track_id: str, format: dict) -> str | None:
+        with _filenames_lock:
+            if track_id in _filenames:
+                _filenames.move_to_end(track_id)
+                return _filenames[track_id]
+
+        cache = self.get_param("scdl_metadata_cache")
+        key = f"original_filename:{track_id}"
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            # stored as "" for tracks without a filename
+            filename = cached or None
+        else:
+            filename = self._request_filename(format)
+            if cache:
+                cache.set(key, filename or "")
+
+        with _filenames_lock:
+            _filenames[track_id] = filename
+            _filenames.move_to_end(track_id)
+            while len(_filenames) > _MAX_FILENAMES:
+                _filenames.popitem(last=False)
+        return filename
+
+    def _request_filename(self, format: dict) -> str | None:
+        headers = format["http_headers"]
+        try:
+            res: Response = self._downloader.urlopen(Request(format["url"], headers=headers, method="HEAD"))
+        except HTTPError:
+            # e.g. signed urls which are only valid for GET
+            self.write_debug("HEAD request failed, requesting the first byte instead")
+            res = self._downloader.urlopen(Request(format["url"], headers={**headers, "Range": "bytes=0-0"}))
+        with res:
+            params = _parse_header(res.get_header("content-disposition"))
+        filename = params.get("filename")
+        if not filename:
+            return None
+        # (charset, language, value) for RFC 2231 encoded filenames (filename*=)
+        if isinstance(filename, tuple):
+            return email.utils.collapse_rfc2231_value(filename)
+        return urllib.parse.unquote(filename, encoding="utf-8")
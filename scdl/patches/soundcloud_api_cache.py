@@ -0,0 +1,51 @@
+# cache track and playlist metadata across runs with scdl's MetadataCache
+import hashlib
+import re
+import urllib.parse
+
+from yt_dlp.extractor.soundcloud import SoundcloudBaseIE
+
+# only metadata is cached, never feeds or (signed) stream urls
+_CACHEABLE_PATH_RE = re.compile(r"/(?:resolve|tracks|tracks/\d+|playlists/\d+|users/\d+)")
+# tracks rarely change, but playlists and users get new tracks
+_PLAYLIST_TTL = 60 * 60
+
+
+def _cache_key(url, kwargs):
+    if not isinstance(url, str) or kwargs.get("data") is not None:
+        return None
+    parsed = urllib.parse.urlparse(url)
+    if parsed.netloc != "api-v2.soundcloud.com" or not _CACHEABLE_PATH_RE.fullmatch(parsed.path):
+        return None
+
+    query = dict(urllib.parse.parse_qsl(parsed.query))
+    query.update(kwargs.get("query") or {})
+    query.pop("client_id", None)
+    # responses differ between users (e.g. go+ formats), so keep them apart
+    auth = (kwargs.get("headers") or {}).get("Authorization")
+    user = hashlib.sha256(auth.encode()).hexdigest()[:16] if auth else "anonymous"
+    return f"soundcloud:{user}:{parsed.path}?{urllib.parse.urlencode(sorted(query.items()))}"
+
+
+old_call_api = SoundcloudBaseIE._call_api
+
+
+def _call_api(self, *args, **kwargs):
+    cache = self.get_param("scdl_metadata_cache")
+    key = cache and args and _cache_key(args[0], kwargs)
+    if not key:
+        return old_call_api(self, *args, **kwargs)
+
+    info = cache.get(key)
+    if info is not None:
+        self.write_debug(f"Loaded {key} from metadata cache")
+        return info
+
+    info = old_call_api(self, *args, **kwargs)
+    if info:
+        kind = info.get("kind") if isinstance(info, dict) else "track"
+        cache.set(key, info, None if kind == "track" else _PLAYLIST_TTL)
+    return info
+
+
+SoundcloudBaseIE._call_api = _call_api
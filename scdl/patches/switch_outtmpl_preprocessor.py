@@ -1,6 +1,15 @@
 # https://github.com/yt-dlp/yt-dlp/issues/11583 workaround
 from yt_dlp.postprocessor.common import PostProcessor
 
+# output template of a single track, used by the patched YoutubeDL._prepare_filename
+# instead of params["outtmpl"]["default"], which is shared by all tracks being downloaded
+OUTTMPL_KEY = "__scdl_outtmpl"
+
+
+def get_outtmpl(ydl, info: dict) -> str:
+    """Output template the track of info is downloaded with"""
+    return info.get(OUTTMPL_KEY) or ydl.params["outtmpl"]["default"]
+
 
 class OuttmplPP(PostProcessor):
     def __init__(self, video_outtmpl: str, playlist_outtmpl: str, downloader=None):
@@ -9,7 +18,7 @@ class OuttmplPP(PostProcessor):
 
     def run(self, info):
         in_playlist = info.get("playlist_uploader") is not None
-        self._downloader.params["outtmpl"]["default"] = self._outtmpls[in_playlist]
+        info[OUTTMPL_KEY] = self._outtmpls[in_playlist]
         if not in_playlist:
             for meta in ("track", "album_artist", "album"):
                 info[f"meta_{meta}"] = None
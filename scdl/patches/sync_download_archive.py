@@ -1,18 +1,146 @@
 import errno
+import json
+import os
+import sys
+import threading
+from array import array
+from collections.abc import Callable, Iterator
 from functools import partial
-from pathlib import Path
 
 from yt_dlp import YoutubeDL
+from yt_dlp.extractor.soundcloud import SoundcloudIE
 from yt_dlp.utils import locked_file
 
+# lines starting with this mark a track as removed
+_REMOVED = "-"
+# rewrite the sync file once it has at least this many times more lines than tracks
+_COMPACT_RATIO = 2
+
+
+class SyncArchive:
+    """Tracks listed in a sync file and the file each one was downloaded to.
+
+    Track ids are kept as integers and every directory is stored only once,
+    so a sync file with millions of tracks stays small in memory.
+    It also serves as `YoutubeDL.archive`, other archive ids (e.g. from --download-archive)
+    are kept as they are.
+    """
+
+    def __init__(self, other: set[str] | None = None):
+        self._rows: dict[int, int] = {}
+        self._dirs: dict[str, int] = {}
+        self._dir_names: list[str] = []
+        self._row_dirs = array("I")
+        self._row_names: list[str] = []
+        self._other = set() if other is None else other
+        # whether the loaded sync file does not end with a newline, e.g. after editing it by hand
+        self.missing_newline = False
+
+    @staticmethod
+    def track_id(archive_id: str) -> int | None:
+        """Return the track id of an archive id like "soundcloud <id>", or None for anything else"""
+        ie, _, id_ = archive_id.partition(" ")
+        if ie == "soundcloud" and id_.isdecimal():
+            return int(id_)
+        return None
+
+    def load(self, sync_file, report_warning: Callable[[str], None]) -> int:
+        """Add the tracks of a sync file, returns the number of records it contains"""
+        records = 0
+        try:
+            with locked_file(sync_file, "r", encoding="utf-8") as archive_file:
+                for raw_line in archive_file:
+                    self.missing_newline = not raw_line.endswith("\n")
+                    line = raw_line.strip()
+                    if not line:
+                        continue
+                    records += 1
+                    if line.startswith(_REMOVED):
+                        track_id = self.track_id(line[len(_REMOVED) :])
+                        if track_id is not None:
+                            self.pop(track_id)
+                        continue
+                    ie, id_, filename = line.split(maxsplit=2)
+                    if ie != "soundcloud" or not id_.isdecimal():
+                        report_warning(f"Ignoring invalid line in sync file: {line}")
+                        continue
+                    self.set(int(id_), filename)
+        except OSError as ioe:
+            if ioe.errno != errno.ENOENT:
+                raise
+        return records
+
+    def get(self, track_id: int) -> str | None:
+        row = self._rows.get(track_id)
+        if row is None:
+            return None
+        return os.path.join(self._dir_names[self._row_dirs[row]], self._row_names[row])
+
+    def set(self, track_id: int, filename: str):
+        head, tail = os.path.split(filename)
+        dir_ = self._dirs.get(head)
+        if dir_ is None:
+            dir_ = self._dirs[head] = len(self._dir_names)
+            self._dir_names.append(head)
+        row = self._rows.get(track_id)
+        if row is None:
+            self._rows[track_id] = len(self._row_names)
+            self._row_dirs.append(dir_)
+            self._row_names.append(tail)
+        else:
+            self._row_dirs[row] = dir_
+            self._row_names[row] = tail
+
+    def pop(self, track_id: int) -> str | None:
+        filename = self.get(track_id)
+        if filename is not None:
+            # rows are not reused, only the name is freed
+            self._row_names[self._rows.pop(track_id)] = ""
+        return filename
+
+    def track_ids(self):
+        return self._rows.keys()
+
+    def items(self) -> Iterator[tuple[int, str]]:
+        for track_id, row in self._rows.items():
+            yield track_id, os.path.join(self._dir_names[self._row_dirs[row]], self._row_names[row])
+
+    # used by YoutubeDL.in_download_archive and record_download_archive
+
+    def __contains__(self, archive_id: str) -> bool:
+        return archive_id in self._other or self.track_id(archive_id) in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._other)
+
+    def add(self, archive_id: str):
+        self._other.add(archive_id)
+
 
 class SyncDownloadHelper:
+    """Keep a playlist and the downloaded files in sync, using the sync file as a journal.
+
+    Every downloaded track is appended to the sync file as soon as it finishes,
+    so an interrupted sync does not have to start over.
+    Tracks which are no longer in the playlist are deleted and recorded as removed at the end.
+
+    With `sync_plan`, the playlist is only listed and the tracks to download and remove are
+    written to a plan instead. `apply_plan` then downloads and removes exactly those tracks.
+    """
+
     def __init__(self, scdl_args, ydl: YoutubeDL):
         self._ydl = ydl
         self._enabled = bool(scdl_args.get("sync"))
         self._sync_file = scdl_args.get("sync")
-        self._all_files: dict[str, Path] = {}
-        self._downloaded: set[str] = set()
+        # checked by yt-dlp together with the ids of --download-archive
+        self._archive = SyncArchive(ydl.archive)
+        self._downloaded: set[int] = set()
+        self._records = 0
+        self._lock = threading.Lock()
+        self._plan_file = scdl_args.get("sync_plan")
+        self._planned_adds: dict[int, dict] = {}
+        self._apply_plan = scdl_args.get("apply_plan")
+        self._planned_removes: set[int] | None = None
         self._init()
 
     def _init(self):
@@ -24,46 +152,136 @@ class SyncDownloadHelper:
             if d["status"] != "finished":
                 return
 
-            info = d["info_dict"]
-
-            id_ = f"soundcloud {info['id']}"
-            self._downloaded.add(id_)
-            self._all_files[id_] = d["filename"]
+            track_id = int(d["info_dict"]["id"])
+            filename = d["filename"]
+            with self._lock:
+                self._downloaded.add(track_id)
+                old_filename = self._archive.get(track_id)
+                if old_filename is None or os.path.normpath(old_filename) != os.path.normpath(filename):
+                    self._archive.set(track_id, filename)
+                    self._append([f"soundcloud {track_id} {filename}"])
 
         self._ydl.add_progress_hook(track_downloaded)
 
         # add already downloaded files to the archive
-        try:
-            with locked_file(self._sync_file, "r", encoding="utf-8") as archive_file:
-                for line in archive_file:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    ie, id_, filename = line.split(maxsplit=2)
-                    self._ydl.archive.add(f"{ie} {id_}")
-                    self._all_files[f"{ie} {id_}"] = Path(filename)
-        except OSError as ioe:
-            if ioe.errno != errno.ENOENT:
-                raise
+        self._records = self._archive.load(self._sync_file, self._ydl.report_warning)
+        self._ydl.archive = self._archive
+
+        if self._apply_plan:
+            with open(self._apply_plan, encoding="utf-8") as plan_file:
+                plan = json.load(plan_file)
+            self._planned_adds = {SyncArchive.track_id(track["id"]): track for track in plan["add"]}
+            self._planned_removes = {SyncArchive.track_id(track["id"]) for track in plan["remove"]}
 
         # track ids checked against the archive
         old_match_entry = self._ydl._match_entry
 
         def _match_entry(ydl, info_dict, incomplete=False, silent=False):
-            self._downloaded.add(ydl._make_archive_id(info_dict))
-            return old_match_entry(info_dict, incomplete, silent)
+            id_ = ydl._make_archive_id(info_dict)
+            track_id = SyncArchive.track_id(id_) if id_ else None
+            if track_id is not None:
+                self._downloaded.add(track_id)
+            reason = old_match_entry(info_dict, incomplete, silent)
+            if reason is None and self._is_unplanned(track_id):
+                reason = f"{info_dict.get('title') or id_} is not in the sync plan"
+                if not silent:
+                    ydl.to_screen(f"[download] {reason}")
+            return reason
 
         self._ydl._match_entry = partial(_match_entry, self._ydl)
 
-    def post_download(self):
+    def _is_unplanned(self, track_id: int | None) -> bool:
+        # only tracks are planned, playlists are still expanded
+        return bool(self._apply_plan) and track_id is not None and track_id not in self._planned_adds
+
+    def _iter_tracks(self, info):
+        if info.get("_type") in ("url", "url_transparent") and info.get("ie_key") != SoundcloudIE.ie_key():
+            info = self._ydl.extract_info(info["url"], download=False, ie_key=info.get("ie_key"), process=False)
+        if not info:
+            return
+        if info.get("_type") in ("playlist", "multi_video"):
+            for entry in info.get("entries") or []:
+                if entry:
+                    yield from self._iter_tracks(entry)
+        else:
+            yield info
+
+    def add_to_plan(self, url: str):
+        """List the tracks of url without downloading them"""
+        info = self._ydl.extract_info(url, download=False, process=False)
+        for entry in self._iter_tracks(info):
+            id_ = self._ydl._make_archive_id(entry)
+            track_id = SyncArchive.track_id(id_) if id_ else None
+            if track_id is None:
+                continue
+            self._downloaded.add(track_id)
+            if track_id not in self._archive.track_ids() and track_id not in self._planned_adds:
+                self._planned_adds[track_id] = {
+                    "id": id_,
+                    "url": entry.get("webpage_url") or entry.get("url"),
+                    "title": entry.get("title"),
+                }
+
+    def _write_plan(self):
+        removed = [track_id for track_id in self._archive.track_ids() if track_id not in self._downloaded]
+        plan = {
+            "sync_file": str(self._sync_file),
+            "add": list(self._planned_adds.values()),
+            "remove": [
+                {"id": f"soundcloud {track_id}", "filename": self._archive.get(track_id)} for track_id in removed
+            ],
+            "unchanged": len(self._archive.track_ids()) - len(removed),
+        }
+        self._ydl.to_screen(
+            f"[sync] {len(plan['add'])} tracks to download, {len(removed)} to remove, {plan['unchanged']} unchanged"
+        )
+        if self._plan_file == "-":
+            sys.stdout.write(json.dumps(plan, indent=2) + "\n")
+            return
+        with open(self._plan_file, "w", encoding="utf-8") as plan_file:
+            json.dump(plan, plan_file, indent=2)
+
+    def _append(self, records: list[str]):
+        with locked_file(self._sync_file, "a", encoding="utf-8") as archive_file:
+            if self._archive.missing_newline:
+                # otherwise the first record would continue the last line
+                archive_file.write("\n")
+                self._archive.missing_newline = False
+            archive_file.writelines(f"{record}\n" for record in records)
+        self._records += len(records)
+
+    def _compact(self):
+        tmp_file = f"{self._sync_file}.part"
+        with open(tmp_file, "w", encoding="utf-8") as archive_file:
+            archive_file.writelines(f"soundcloud {k} {v}\n" for k, v in self._archive.items())
+        os.replace(tmp_file, self._sync_file)
+        self._archive.missing_newline = False
+        self._records = len(self._archive.track_ids())
+
+    def post_download(self, complete: bool = True):
+        """Remove the tracks which were not listed, unless some url failed (complete=False)"""
         if not self._enabled:
             return
 
-        # remove extra files
-        to_remove = {self._all_files[key] for key in (set(self._all_files.keys()) - self._downloaded)}
-        self._ydl._delete_downloaded_files(*to_remove)
+        if not complete:
+            # tracks of a url which failed to list are missing from self._downloaded
+            self._ydl.report_warning("Not removing any tracks from the sync file, since some urls failed")
+            self._downloaded |= self._archive.track_ids()
+
+        if self._plan_file:
+            self._write_plan()
+            return
+
+        with self._lock:
+            # remove extra files
+            removed = self._archive.track_ids() - self._downloaded
+            if self._planned_removes is not None:
+                removed &= self._planned_removes
+            to_remove = {self._archive.pop(track_id) for track_id in removed}
+            self._ydl._delete_downloaded_files(*to_remove)
 
-        with locked_file(self._sync_file, "w", encoding="utf-8") as archive_file:
-            for k, v in self._all_files.items():
-                if k in self._downloaded:
-                    archive_file.write(f"{k} {v}\n")
+            tracks = len(self._archive.track_ids())
+            if self._records + len(removed) >= _COMPACT_RATIO * max(tracks, 1):
+                self._compact()
+            elif removed:
+                self._append([f"{_REMOVED}soundcloud {track_id}" for track_id in removed])
@@ -1,10 +1,12 @@
 # https://github.com/yt-dlp/yt-dlp/pull/12023
 
+import functools
 import os
 import platform
 import re
 import sys
 from pathlib import Path
+from typing import Callable
 
 import yt_dlp.__init__
 from yt_dlp import YoutubeDL, options
@@ -12,10 +14,69 @@ from yt_dlp.__init__ import validate_options as old_validate_options
 from yt_dlp.utils import OUTTMPL_TYPES, preferredencoding, replace_extension
 from yt_dlp.YoutubeDL import _catch_unsafe_extension_error
 
+from scdl.patches.switch_outtmpl_preprocessor import get_outtmpl
+
+# filename encoding used for trimming to a number of bytes
+_ENCODING = sys.getfilesystemencoding() if platform.system() != "Windows" else "utf-16-le"
+
+
+@functools.cache
+def _compile_trim(trim_file_name: str | None) -> Callable[[str], str] | None:
+    """Function trimming each part of a path to the --trim-filenames length, None for no maximum"""
+    if trim_file_name is None or trim_file_name == "none":
+        return None
+    mobj = re.match(r"(?:(?P<length>\d+)(?P<mode>b|c)?|none)", trim_file_name)
+    max_length = int(mobj.group("length"))
+    if max_length == 0:
+        return None
+
+    if mobj.group("mode") == "b":
+
+        def fits(name: str) -> bool:
+            # a character takes at most 4 bytes
+            return len(name) <= max_length // 4 or len(name.encode(_ENCODING)) <= max_length
+
+        def trim_name(name: str) -> str:
+            return name.encode(_ENCODING)[:max_length].decode(_ENCODING, "ignore")
+
+    else:
+
+        def fits(name: str) -> bool:
+            return len(name) <= max_length
+
+        def trim_name(name: str) -> str:
+            return name[:max_length]
+
+    def trim(filename: str) -> str:
+        if not _is_normalized(filename):
+            return os.path.join(*map(trim_name, Path(filename).parts or "."))
+        # the parts of a normalized path, without building a Path
+        parts = filename.split("/")
+        if all(map(fits, parts)):
+            return filename
+        if not parts[0]:
+            parts[0] = "/"
+        return os.path.join(*(part if fits(part) else trim_name(part) for part in parts))
+
+    return trim
+
+
+def _is_normalized(filename: str) -> bool:
+    """Whether filename is unchanged by joining its Path parts again"""
+    return (
+        os.sep == "/"
+        and filename not in ("", ".")
+        and "//" not in filename
+        and "/./" not in filename
+        and not filename.startswith("./")
+        and not filename.endswith(("/", "/."))
+    )
+
 
 def evaluate_outtmpl(self, outtmpl, info_dict, *args, trim_filename=False, **kwargs):
     outtmpl, info_dict = self.prepare_outtmpl(outtmpl, info_dict, *args, **kwargs)
-    if not trim_filename:
+    trim = _compile_trim(self.params.get("trim_file_name")) if trim_filename else None
+    if trim is None:
         return self.escape_outtmpl(outtmpl) % info_dict
 
     ext_suffix = ".%(ext\0s)s"
@@ -23,38 +84,16 @@ def evaluate_outtmpl(self, outtmpl, info_dict, *args, trim_filename=False, **kwa
     if outtmpl.endswith(ext_suffix):
         outtmpl = outtmpl[: -len(ext_suffix)]
         suffix = ext_suffix % info_dict
-    outtmpl = self.escape_outtmpl(outtmpl)
-    filename = outtmpl % info_dict
-
-    def parse_trim_file_name(trim_file_name):
-        if trim_file_name is None or trim_file_name == "none":
-            return 0, None
-        mobj = re.match(r"(?:(?P<length>\d+)(?P<mode>b|c)?|none)", trim_file_name)
-        return int(mobj.group("length")), mobj.group("mode") or "c"
-
-    max_file_name, mode = parse_trim_file_name(self.params.get("trim_file_name"))
-    if max_file_name == 0:
-        # no maximum
-        return filename + suffix
-
-    encoding = sys.getfilesystemencoding() if platform.system() != "Windows" else "utf-16-le"
-
-    def trim_filename(name: str):
-        if mode == "b":
-            name = name.encode(encoding)
-            name = name[:max_file_name]
-            return name.decode(encoding, "ignore")
-        return name[:max_file_name]
-
-    filename = os.path.join(*map(trim_filename, Path(filename).parts or "."))
-    return filename + suffix
+    return trim(self.escape_outtmpl(outtmpl) % info_dict) + suffix
 
 
 @_catch_unsafe_extension_error
 def _prepare_filename(self, info_dict, *, outtmpl=None, tmpl_type=None):
     assert None in (outtmpl, tmpl_type), "outtmpl and tmpl_type are mutually exclusive"
     if outtmpl is None:
-        outtmpl = self.params["outtmpl"].get(tmpl_type or "default", self.params["outtmpl"]["default"])
+        # other templates (e.g. thumbnail) fall back to the template of the track
+        outtmpl = self.params["outtmpl"].get(tmpl_type) if tmpl_type else None
+        outtmpl = outtmpl or get_outtmpl(self, info_dict)
     try:
         outtmpl = self._outtmpl_expandpath(outtmpl)
         filename = self.evaluate_outtmpl(outtmpl, info_dict, True, trim_filename=True)
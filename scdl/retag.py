@@ -0,0 +1,166 @@
+"""Tag already downloaded tracks again, without downloading anything
+
+The metadata of each track is stored in the metadata cache by MutagenPP when it is downloaded.
+Files are tagged on a pool of processes, and the files which are done are recorded in the
+directory, so that an interrupted run continues where it stopped.
+"""
+
+from __future__ import annotations
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from scdl.metadata_cache import MetadataCache
+
+logger = logging.getLogger("scdl.scdl")
+
+# files which are already retagged, removed once all files are done
+_STATE_FILE = ".scdl-retag"
+# options which change the tags
+_TAG_OPTIONS = ("extract_artist", "no_album_tag", "yt_dlp_args")
+_REPORT_INTERVAL = 5
+
+# YoutubeDL and MutagenPP of a worker process
+_worker: dict[str, Any] = {}
+
+
+def _init_worker(scdl_args: dict, create_ydl: Callable) -> None:
+    from scdl.patches.mutagen_postprocessor import MutagenPP
+
+    ydl = create_ydl(scdl_args)
+    _worker["ydl"] = ydl
+    _worker["pp"] = MutagenPP(True, ydl, scdl_args.get("tag_padding"))
+
+
+def _retag_file(task: tuple[str, dict]) -> tuple[str, str, str | None]:
+    from scdl.patches.dedupe_store import STORED_KEY, remove_playlist_tags
+
+    filename, info = task
+    ydl, pp = _worker["ydl"], _worker["pp"]
+    tag_stats = ydl.params["scdl_tag_stats"]
+    rewritten = tag_stats["rewritten"]
+    try:
+        # e.g. --extract-artist and the album tags
+        info = ydl.run_all_pps("pre_process", {**info, "filepath": filename})
+        if info.get(STORED_KEY):
+            # the file of --dedupe-store is shared by all playlists of the track, like DedupeStorePP does
+            remove_playlist_tags(info)
+        metadata = pp._get_metadata_dict(info)["common"]
+        changed = pp._embed_metadata(filename, metadata)
+    except Exception as err:
+        cause = f": {err.__cause__}" if err.__cause__ else ""
+        return filename, "failed", f"{err}{cause}"
+    if tag_stats["rewritten"] != rewritten:
+        return filename, "rewritten", None
+    return filename, "updated" if changed else "unchanged", None
+
+
+def _read_archive_ids(download_archive: str) -> set[int]:
+    with open(download_archive, encoding="utf-8") as archive_file:
+        # "soundcloud <id>", or only the id for archives of old versions
+        ids = (line.split()[-1] for line in archive_file if line.strip())
+        return {int(id_) for id_ in ids if id_.isdecimal()}
+
+
+def _find_tracks(directory: Path, scdl_args: dict, cache: MetadataCache) -> list[tuple[str, dict]]:
+    if scdl_args.get("sync"):
+        from scdl.patches.sync_download_archive import SyncArchive
+
+        archive = SyncArchive()
+        archive.load(scdl_args["sync"], logger.warning)
+        tracks = ((filename, cache.get_track(track_id)) for track_id, filename in archive.items())
+    else:
+        ids = _read_archive_ids(scdl_args["download_archive"]) if scdl_args.get("download_archive") else None
+        tracks = (
+            (filename, info) for track_id, filename, info in cache.iter_tracks() if ids is None or track_id in ids
+        )
+
+    prefix = os.path.join(directory, "")
+    found = []
+    missing = 0
+    for filename, info in tracks:
+        filename = os.path.abspath(filename)
+        if not filename.startswith(prefix) or not os.path.isfile(filename):
+            continue
+        if info is None:
+            missing += 1
+            continue
+        found.append((filename, info))
+    if missing:
+        logger.warning(
+            f"[retag] Skipping {missing} files without stored metadata, "
+            "download them again with --force-metadata to store it"
+        )
+    return found
+
+
+def _options_key(scdl_args: dict) -> str:
+    options = {option: scdl_args.get(option) for option in _TAG_OPTIONS}
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _read_state(state_file: Path, options: str) -> set[str]:
+    try:
+        with open(state_file, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return set()
+    # files retagged with other options have to be done again
+    if not lines or lines[0] != options:
+        return set()
+    return set(lines[1:])
+
+
+def retag(directory: Path, scdl_args: dict, cache: MetadataCache, create_ydl: Callable) -> int:
+    """Tag the downloaded tracks in directory again, returns the exit status.
+
+    `create_ydl(scdl_args)` is called in every worker process to create the YoutubeDL
+    running the metadata preprocessors (e.g. --parse-metadata).
+    """
+    state_file = directory / _STATE_FILE
+    options = _options_key(scdl_args)
+    done = _read_state(state_file, options)
+    tasks = [task for task in _find_tracks(directory, scdl_args, cache) if task[0] not in done]
+    if done:
+        logger.info(f"[retag] Resuming, {len(done)} files were already retagged")
+    logger.info(f"[retag] Retagging {len(tasks)} files in {directory}")
+
+    counts: collections.Counter[str] = collections.Counter()
+    start = last_report = time.perf_counter()
+    with (
+        open(state_file, "a" if done else "w", encoding="utf-8") as state,
+        ProcessPoolExecutor(scdl_args.get("jobs"), initializer=_init_worker, initargs=(scdl_args, create_ydl)) as pool,
+    ):
+        if not done:
+            state.write(f"{options}\n")
+        for i, (filename, status, error) in enumerate(pool.map(_retag_file, tasks, chunksize=32), 1):
+            counts[status] += 1
+            if error:
+                logger.error(f"[retag] Unable to retag {filename}: {error}")
+            else:
+                state.write(f"{filename}\n")
+            now = time.perf_counter()
+            if now - last_report >= _REPORT_INTERVAL:
+                state.flush()
+                logger.info(f"[retag] {i}/{len(tasks)} files, {i / (now - start):.0f} files/s")
+                last_report = now
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"[retag] Retagged {len(tasks)} files in {elapsed:.1f}s ({len(tasks) / max(elapsed, 1e-3):.0f} files/s): "
+        f"{counts['updated'] + counts['rewritten']} updated ({counts['rewritten']} rewritten completely), "
+        f"{counts['unchanged']} unchanged, {counts['failed']} failed"
+    )
+    if counts["failed"]:
+        return 1
+    os.remove(state_file)
+    return 0
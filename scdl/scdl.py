@@ -1,15 +1,23 @@
 """scdl allows you to download music from Soundcloud
 
 Usage:
-    scdl (-l <track_url> | -s <search_query> | me) [-a | -f | -C | -t | -p | -r]
+    scdl (-l <track_url> | -s <search_query> | me | --batch-file <file>) [-a | -f | -C | -t | -p | -r]
     [-c | --force-metadata][-o <offset>][--hidewarnings][--debug | --error]
     [--path <path>][--addtofile][--addtimestamp][--onlymp3][--hide-progress][--min-size <size>]
     [--max-size <size>][--no-album-tag][--no-playlist-folder]
-    [--download-archive <file>][--sync <file>][--extract-artist][--flac][--original-art]
+    [--download-archive <file>][--sync <file>][--sync-plan <file> | --apply-plan <file>]
+    [--extract-artist][--flac][--original-art][--tag-padding <size>]
     [--original-name][--original-metadata][--no-original][--only-original]
     [--name-format <format>][--strict-playlist][--playlist-name-format <format>]
     [--client-id <id>][--auth-token <token>][--overwrite][--no-playlist][--opus]
-    [--add-description][--yt-dlp-args <argstring>]
+    [--add-description][--yt-dlp-args <argstring>][--jobs <n>][--pipeline][--fragment-concurrency <n>]
+    [--cache-dir <dir> | --no-cache][--incremental][--full-rescan][--dedupe-store <dir>][--tag-workers <n>]
+    [--scan-path]
+    scdl retag <directory> [--sync <file> | --download-archive <file>][--jobs <n>][--cache-dir <dir>]
+    [--extract-artist][--no-album-tag][--tag-padding <size>][--yt-dlp-args <argstring>]
+    [--debug | --error]
+    scdl serve [--host <host>][--port <port>][--workers <n>][--path <path>]
+    [--client-id <id>][--auth-token <token>][--debug | --error]
 
     scdl -h | --help
     scdl --version
@@ -20,6 +28,8 @@ Options:
     --version                       Show version
     -l [url]                        URL can be track/playlist/user
     -s [search_query]               Search for a track/playlist/user and use the first result
+    --batch-file [file]             File containing URLs to download, one per line.
+                                    Use "-" to read URLs from stdin
     -a                              Download all tracks of user (including reposts)
     -t                              Download all uploads of a user (no reposts)
     -f                              Download all favorites (likes) of a user
@@ -49,6 +59,10 @@ Options:
     --path [path]                   Use a custom path for downloaded files
     --sync [file]                   Compares an archive file to a playlist and downloads/removes
                                     any changed tracks
+    --sync-plan [file]              With --sync, only list the tracks to download and remove,
+                                    and write them as JSON to a plan file. Use "-" for stdout
+    --apply-plan [file]             With --sync, download and remove only the tracks of a plan
+                                    written by --sync-plan
     --flac                          Convert original files to .flac. Only works if the original
                                     file is lossless quality
     --no-album-tag                  On some player track get the same cover art if from the same
@@ -70,11 +84,46 @@ Options:
     --add-description               Adds the description to a separate txt file
     --opus                          Prefer downloading opus streams over mp3 streams
     --yt-dlp-args [argstring]       String with custom args to forward to yt-dlp
+    --jobs [n]                      Download up to n tracks of a playlist or user at the same time.
+                                    With retag, the number of processes (default: one per core)
+    --pipeline                      Extract, download and tag tracks of a playlist or user in
+                                    parallel stages (always enabled with --jobs or --tag-workers)
+    --fragment-concurrency [n]      Download up to n segments of a stream at the same time
+                                    (default: 4)
+    --cache-dir [dir]               Directory of the SoundCloud metadata cache
+                                    (default: the directory of scdl.cfg)
+    --no-cache                      Do not cache SoundCloud metadata between runs
+    --incremental                   Stop listing the tracks, likes or reposts of a user
+                                    (-t, -f, -r, -a) at the items reached by the last run
+    --full-rescan                   List all items with --incremental, e.g. to catch up
+                                    on items missed by earlier runs
+    --dedupe-store [dir]            Download each track only once into dir, and link it into
+                                    the folders of the playlists it belongs to (tracks already in
+                                    the --download-archive are not linked)
+    --tag-padding [size]            Reserve size (k/m) of padding after the tags, so that later
+                                    tag or cover art changes do not rewrite the whole file
+    --tag-workers [n]               Tag up to n downloaded tracks of a playlist or user at the same
+                                    time, while the next tracks are downloaded (default: 1)
+    --scan-path                     List the files in --path once at startup, instead of checking
+                                    the files of each track (e.g. for libraries on network drives)
+
+Retag:
+    Tags the tracks downloaded into <directory> again, e.g. after changing --extract-artist,
+    using the metadata stored in the metadata cache when they were downloaded. Tracks are found
+    through the sync file, or else through the cache (only those in --download-archive if given).
+    Tags are added or replaced, but never removed.
+
+Serve options:
+    --host [host]                   Address to listen on for download jobs (default: 127.0.0.1)
+    --port [port]                   Port to listen on for download jobs (default: 8000)
+    --workers [n]                   Number of download jobs to run at the same time (default: 2)
 """
 
 from __future__ import annotations
 
+import collections
 import configparser
+import hashlib
 import importlib
 import importlib.metadata
 import logging
@@ -86,22 +135,19 @@ from pathlib import Path
 from typing import TYPE_CHECKING, TypedDict
 
 from docopt import docopt
-from soundcloud import (
-    AlbumPlaylist,
-    SoundCloud,
-    Track,
-    User,
-)
-from yt_dlp import YoutubeDL
-from yt_dlp.utils import locked_file
-
-from scdl import utils
-from scdl.patches.mutagen_postprocessor import MutagenPP
-from scdl.patches.original_filename_preprocessor import OriginalFilenamePP
-from scdl.patches.switch_outtmpl_preprocessor import OuttmplPP
-from scdl.patches.sync_download_archive import SyncDownloadHelper
+
+from scdl import patches, utils
+from scdl.metadata_cache import MetadataCache
+
+# yt-dlp, soundcloud and the patches are imported where they are needed,
+# so that --help and --version do not have to wait for them
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from soundcloud import SoundCloud
+    from yt_dlp import YoutubeDL
+
     if sys.version_info < (3, 11):
         from typing_extensions import Unpack
     else:
@@ -118,24 +164,33 @@ class SCDLArgs(TypedDict):
     add_description: bool
     addtimestamp: bool
     addtofile: bool
+    apply_plan: str | None
     auth_token: str | None
+    batch_file: str | None
     c: bool
+    cache_dir: Path | None
     client_id: str | None
     debug: bool
+    dedupe_store: Path | None
     download_archive: str | None
     error: bool
     extract_artist: bool
     f: bool
     flac: bool
     force_metadata: bool
+    fragment_concurrency: int | None
+    full_rescan: bool
     hide_progress: bool
     hidewarnings: bool
+    incremental: bool
+    jobs: int | None
     l: str  # noqa: E741
     max_size: str | None
     me: bool
     min_size: str | None
     name_format: str
     no_album_tag: bool
+    no_cache: bool
     no_original: bool
     no_playlist: bool
     no_playlist_folder: bool
@@ -149,10 +204,15 @@ class SCDLArgs(TypedDict):
     overwrite: bool
     p: bool
     path: Path
+    pipeline: bool
     playlist_name_format: str
     r: bool
+    scan_path: bool
     strict_playlist: bool
     sync: str | None
+    sync_plan: str | None
+    tag_padding: int | None
+    tag_workers: int | None
     s: str | None
     t: bool
     yt_dlp_args: str
@@ -186,9 +246,166 @@ def _main() -> None:
     client_id = arguments["--client-id"] or config["scdl"]["client_id"]
     token = arguments["--auth-token"] or config["scdl"]["auth_token"]
 
+    try:
+        validation_ttl = int(config["scdl"].get("validation_ttl") or 0)
+    except ValueError:
+        logger.error(f"[scdl] validation_ttl in {config_file} should be a number of seconds")
+        sys.exit(1)
+
+    if not arguments["--no-cache"]:
+        arguments["--cache-dir"] = Path(arguments["--cache-dir"] or config_file.parent).resolve()
+
+    try:
+        utils.check_options(_to_python_args(arguments))
+    except ValueError as err:
+        logger.error(f"[scdl] {err}")
+        sys.exit(1)
+
+    if arguments["--dedupe-store"]:
+        arguments["--dedupe-store"] = Path(arguments["--dedupe-store"]).resolve()
+
+    if arguments["-o"] is not None:
+        try:
+            arguments["-o"] = int(arguments["-o"])
+            if arguments["-o"] < 1:
+                raise ValueError
+        except Exception:
+            logger.error("[scdl] Offset should be a positive integer")
+            sys.exit(1)
+
+    if arguments["--tag-padding"] is not None:
+        from yt_dlp.utils import parse_bytes
+
+        arguments["--tag-padding"] = parse_bytes(arguments["--tag-padding"])
+        if arguments["--tag-padding"] is None:
+            logger.error("[scdl] Tag padding should be a size, e.g. 64k")
+            sys.exit(1)
+
+    for option, name in (
+        ("--jobs", "Number of jobs"),
+        ("--fragment-concurrency", "Fragment concurrency"),
+        ("--tag-workers", "Number of tag workers"),
+        ("--port", "Port"),
+        ("--workers", "Number of workers"),
+    ):
+        if arguments[option] is not None:
+            try:
+                arguments[option] = int(arguments[option])
+                if arguments[option] < 1:
+                    raise ValueError
+            except Exception:
+                logger.error(f"[scdl] {name} should be a positive integer")
+                sys.exit(1)
+
+    if not arguments["--name-format"]:
+        arguments["--name-format"] = config["scdl"]["name_format"]
+
+    if not arguments["--playlist-name-format"]:
+        arguments["--playlist-name-format"] = config["scdl"]["playlist_name_format"]
+
+    arguments["--path"] = Path(arguments["--path"] or config["scdl"]["path"] or ".").resolve()
+
+    if arguments["retag"]:
+        sys.exit(_retag(_to_python_args(arguments)))
+
+    cache = _open_metadata_cache(arguments["--cache-dir"])
+
+    client = _validate_client(client_id, token, arguments, config, config_file, cache, validation_ttl)
+
+    try:
+        _resolve_url(client, arguments, cache)
+    except Exception as err:
+        if not _is_auth_error(err):
+            raise
+        # the client_id or auth_token was trusted because of an earlier validation
+        logger.info(f"[scdl] Request failed with {err}, validating client_id and auth_token again")
+        _forget_validation(cache, client.client_id, client.auth_token)
+        client = _validate_client(
+            client.client_id, client.auth_token, arguments, config, config_file, cache, validation_ttl
+        )
+        _resolve_url(client, arguments, cache)
+
+    if cache:
+        cache.close()
+
+    python_args = _to_python_args(arguments)
+    python_args["client_id"] = client.client_id
+    python_args["auth_token"] = client.auth_token
+    url = python_args.pop("l")
+
+    if python_args["serve"]:
+        from scdl.serve import JobServer
+
+        server = JobServer(python_args, _download_job, python_args["workers"] or 2)
+        server.serve_forever(python_args["host"] or "127.0.0.1", python_args["port"] or 8000)
+        return
+
+    if python_args["batch_file"]:
+        urls = _read_batch_file(python_args["batch_file"])
+        statuses = download_urls(urls, **python_args)
+        failed = [url for url, status in statuses.items() if status]
+        for url in failed:
+            logger.error(f"[scdl] Failed to download {url}")
+        logger.info(f"[scdl] Downloaded {len(statuses) - len(failed)} of {len(statuses)} URLs")
+        sys.exit(1 if failed else 0)
+
+    assert url is not None
+
+    download_url(url, **python_args)
+
+
+def _to_python_args(arguments: dict) -> dict:
+    # convert arguments dict to python-friendly kwarg names (no hyphens)
+    python_args = {}
+    for key, value in arguments.items():
+        key = key.strip("-<>").replace("-", "_")
+        python_args[key] = value
+    return python_args
+
+
+def _retag(scdl_args: dict) -> int:
+    from scdl.retag import retag
+
+    cache = _open_metadata_cache(scdl_args["cache_dir"])
+    if not cache:
+        logger.error("[scdl] retag needs the metadata stored in the metadata cache")
+        return 1
+    try:
+        return retag(Path(scdl_args["directory"]).resolve(), scdl_args, cache, _create_retag_ydl)
+    finally:
+        cache.close()
+
+
+def _read_batch_file(batch_file: str) -> list[str]:
+    """Read URLs from a batch file, or from stdin if batch_file is "-"."""
+    from yt_dlp.utils import read_batch_urls
+
+    if batch_file == "-":
+        return read_batch_urls(sys.stdin)
+    try:
+        with open(batch_file, encoding="utf-8", errors="ignore") as f:
+            return read_batch_urls(f)
+    except OSError as err:
+        logger.error(f"[scdl] Could not read batch file: {err}")
+        sys.exit(1)
+
+
+def _validate_client(
+    client_id: str | None,
+    token: str | None,
+    arguments: dict,
+    config: configparser.RawConfigParser,
+    config_file: Path,
+    cache: MetadataCache | None,
+    validation_ttl: int,
+) -> SoundCloud:
+    """Return a SoundCloud client with a valid client_id, exiting if the auth token is invalid."""
+    from soundcloud import SoundCloud
+    from yt_dlp.utils import locked_file
+
     client = SoundCloud(client_id, token if token else None)
 
-    if not client.is_client_id_valid():
+    if not _is_valid(cache, "client_id", client.client_id, client.is_client_id_valid, validation_ttl):
         if arguments["--client-id"]:
             logger.warning(
                 "[scdl] Invalid client_id specified by --client-id argument. "
@@ -201,7 +418,7 @@ def _main() -> None:
         else:
             logger.info("[scdl] Generating dynamic client_id")
         client = SoundCloud(None, token if token else None)
-        if not client.is_client_id_valid():
+        if not _is_valid(cache, "client_id", client.client_id, client.is_client_id_valid, validation_ttl):
             logger.error("[scdl] Dynamically generated client_id is not valid")
             sys.exit(1)
         config["scdl"]["client_id"] = client.client_id
@@ -211,78 +428,122 @@ def _main() -> None:
         with locked_file(config_file, "w", encoding="utf-8") as f:
             config.write(f)
 
-    if (token or arguments["me"]) and not client.is_auth_token_valid():
+    if (token or arguments["me"]) and not _is_valid(
+        cache, "auth_token", client.auth_token, client.is_auth_token_valid, validation_ttl
+    ):
         if arguments["--auth-token"]:
             logger.error("[scdl] Invalid auth_token specified by --auth-token argument")
         else:
             logger.error(f"[scdl] Invalid auth_token in {config_file}")
         sys.exit(1)
 
-    if arguments["-o"] is not None:
-        try:
-            arguments["-o"] = int(arguments["-o"])
-            if arguments["-o"] < 1:
-                raise ValueError
-        except Exception:
-            logger.error("[scdl] Offset should be a positive integer")
-            sys.exit(1)
+    return client
 
-    if not arguments["--name-format"]:
-        arguments["--name-format"] = config["scdl"]["name_format"]
 
-    if not arguments["--playlist-name-format"]:
-        arguments["--playlist-name-format"] = config["scdl"]["playlist_name_format"]
+def _validation_key(name: str, value: str) -> str:
+    return f"valid:{name}:{hashlib.sha256(value.encode()).hexdigest()}"
+
+
+def _is_valid(
+    cache: MetadataCache | None,
+    name: str,
+    value: str | None,
+    check: Callable[[], bool],
+    ttl: int,
+) -> bool:
+    """Run check(), trusting a successful check of a previous run for ttl seconds."""
+    key = _validation_key(name, value) if cache and value and ttl > 0 else None
+    if cache and key and cache.get(key):
+        logger.debug(f"[debug] Skipping validation of {name}, it was validated recently")
+        return True
+    valid = check()
+    if cache and key and valid:
+        cache.set(key, True, ttl)
+    return valid
+
+
+def _forget_validation(cache: MetadataCache | None, client_id: str | None, auth_token: str | None) -> None:
+    if not cache:
+        return
+    for name, value in (("client_id", client_id), ("auth_token", auth_token)):
+        if value:
+            cache.delete(_validation_key(name, value))
+
 
+def _is_auth_error(err: Exception) -> bool:
+    # HTTPError of requests or curl_cffi, depending on the version of soundcloud-v2
+    return getattr(getattr(err, "response", None), "status_code", None) in (401, 403)
+
+
+def _resolve_url(client: SoundCloud, arguments: dict, cache: MetadataCache | None) -> None:
+    """Set the URL to download for "me" and -s"""
     if arguments["me"]:
         # set url to profile associated with auth token
-        me = client.get_me()
-        assert me is not None
-        arguments["-l"] = me.permalink_url
+        arguments["-l"] = _get_me_url(client, cache)
 
     if arguments["-s"]:
-        url = _search_soundcloud(client, arguments["-s"])
+        url = _search_soundcloud(client, arguments["-s"], cache)
         if url:
             arguments["-l"] = url
         else:
             logger.error("[scdl] Search failed")
             sys.exit(1)
 
-    arguments["--path"] = Path(arguments["--path"] or config["scdl"]["path"] or ".").resolve()
 
-    # convert arguments dict to python-friendly kwarg names (no hyphens)
-    python_args = {}
-    for key, value in arguments.items():
-        key = key.strip("-").replace("-", "_")
-        python_args[key] = value
-
-    python_args["client_id"] = client.client_id
-    python_args["auth_token"] = client.auth_token
-    url = python_args.pop("l")
+def _open_metadata_cache(cache_dir: Path | None) -> MetadataCache | None:
+    if not cache_dir:
+        return None
+    try:
+        return MetadataCache(cache_dir / "metadata.sqlite3")
+    except Exception as err:
+        logger.warning(f"[scdl] Could not open metadata cache: {err}")
+        return None
 
-    assert url is not None
 
-    download_url(url, **python_args)
+def _get_me_url(client: SoundCloud, cache: MetadataCache | None) -> str:
+    """Return the URL of the profile associated with the auth token."""
+    key = f"me:{hashlib.sha256(client.auth_token.encode()).hexdigest()}" if client.auth_token else None
+    url = cache.get(key) if cache and key else None
+    if url is None:
+        me = client.get_me()
+        assert me is not None
+        url = me.permalink_url
+        if cache and key:
+            cache.set(key, url)
+    return url
 
 
-def _search_soundcloud(client: SoundCloud, query: str) -> str | None:
+def _search_soundcloud(client: SoundCloud, query: str, cache: MetadataCache | None = None) -> str | None:
     """Search SoundCloud and return the URL of the first result."""
+    from soundcloud import AlbumPlaylist, Track, User
+
+    url = cache.get(f"search:{query}") if cache else None
+    if url is not None:
+        logger.info(f"Search resolved to url {url}")
+        return url
     try:
         results = list(client.search(query, limit=1))
         if results:
             item = results[0]
             logger.info(f"Search resolved to url {item.permalink_url}")
             if isinstance(item, (Track, AlbumPlaylist, User)):
+                if cache:
+                    cache.set(f"search:{query}", item.permalink_url)
                 return item.permalink_url
             logger.warning(f"Unexpected search result type: {type(item)}")
         logger.error(f"No results found for query: {query}")
         return None
     except Exception as e:
+        if _is_auth_error(e):
+            raise
         logger.error(f"Error searching SoundCloud: {e}")
         return None
 
 
 def _get_config(config_file: Path) -> configparser.RawConfigParser:
     """Gets config from scdl.cfg"""
+    from yt_dlp.utils import locked_file
+
     config = configparser.RawConfigParser()
 
     default_config_file = Path(__file__).with_name("scdl.cfg")
@@ -381,9 +642,7 @@ def _build_ytdl_format_specifier(scdl_args: SCDLArgs) -> str:
     return fmt
 
 
-def _build_ytdl_params(url: str, scdl_args: SCDLArgs) -> tuple[str, dict, list]:
-    # return download url, ytdl params, and postprocessors
-
+def _build_ytdl_url(url: str, scdl_args: SCDLArgs) -> str:
     if scdl_args.get("a"):
         pass
     elif scdl_args.get("t"):
@@ -396,6 +655,11 @@ def _build_ytdl_params(url: str, scdl_args: SCDLArgs) -> tuple[str, dict, list]:
         url = posixpath.join(url, "sets")
     elif scdl_args.get("r"):
         url = posixpath.join(url, "reposts")
+    return url
+
+
+def _build_ytdl_params(scdl_args: SCDLArgs) -> tuple[dict, list]:
+    # return ytdl params and postprocessors
 
     params: dict = {}
 
@@ -408,15 +672,9 @@ def _build_ytdl_params(url: str, scdl_args: SCDLArgs) -> tuple[str, dict, list]:
     params["--output-na-placeholder"] = ""
     params["--parse-metadata"] = []
     params["--trim-filenames"] = "240b"
-    postprocessors = [
-        (
-            OuttmplPP(
-                _build_ytdl_output_filename(scdl_args, False),
-                _build_ytdl_output_filename(scdl_args, True),
-            ),
-            "pre_process",
-        )
-    ]
+    # the aac and mp3 streams are HLS with segments of a few seconds each, so fetching them
+    # one after another is dominated by the latency of each request
+    params["--concurrent-fragments"] = str(scdl_args.get("fragment_concurrency") or 4)
 
     if scdl_args.get("strict_playlist"):
         params["--abort-on-error"] = True
@@ -465,9 +723,6 @@ def _build_ytdl_params(url: str, scdl_args: SCDLArgs) -> tuple[str, dict, list]:
             "%(playlist_index)s:%(meta_track)s",
         ]
 
-    if scdl_args.get("original_name") and not scdl_args.get("no_original"):
-        postprocessors.append((OriginalFilenamePP(), "pre_process"))
-
     if not scdl_args.get("original_art"):
         params["--thumbnail-id"] = "t500x500"
 
@@ -480,8 +735,6 @@ def _build_ytdl_params(url: str, scdl_args: SCDLArgs) -> tuple[str, dict, list]:
     if scdl_args.get("original_metadata"):
         params["--embed-metadata"] = False
         params["--embed-thumbnail"] = False
-    else:
-        postprocessors.append((MutagenPP(scdl_args["force_metadata"]), "post_process"))
 
     if scdl_args.get("auth_token"):
         params["--username"] = "oauth"
@@ -519,13 +772,59 @@ def _build_ytdl_params(url: str, scdl_args: SCDLArgs) -> tuple[str, dict, list]:
             argv.append(param)
             argv.append(value)
 
-    logger.debug(f"[debug] yt-dlp args: {url} {' '.join(argv)}")
+    logger.debug(f"[debug] yt-dlp args: {' '.join(argv)}")
 
-    return url, utils.cli_to_api(argv), postprocessors
+    return utils.cli_to_api(argv), _build_ytdl_postprocessors(scdl_args)
 
 
-def download_url(url: str, **scdl_args: Unpack[SCDLArgs]) -> None:
-    url, params, postprocessors = _build_ytdl_params(url, scdl_args)
+def _build_ytdl_postprocessors(scdl_args: SCDLArgs) -> list:
+    from scdl.patches.dedupe_store import DedupeLinkPP, DedupeStorePP
+    from scdl.patches.mutagen_postprocessor import MutagenPP
+    from scdl.patches.original_filename_preprocessor import OriginalFilenamePP
+    from scdl.patches.switch_outtmpl_preprocessor import OuttmplPP
+
+    # postprocessors are bound to a single YoutubeDL, so build a fresh list for each one
+    postprocessors = [
+        (
+            OuttmplPP(
+                _build_ytdl_output_filename(scdl_args, False),
+                _build_ytdl_output_filename(scdl_args, True),
+            ),
+            "pre_process",
+        )
+    ]
+
+    if scdl_args.get("original_name") and not scdl_args.get("no_original"):
+        postprocessors.append((OriginalFilenamePP(), "pre_process"))
+
+    dedupe_store = scdl_args.get("dedupe_store") if scdl_args.get("name_format") != "-" else None
+    if dedupe_store:
+        postprocessors.append((DedupeStorePP(Path(dedupe_store)), "pre_process"))
+
+    if not scdl_args.get("original_metadata"):
+        mutagen_pp = MutagenPP(scdl_args["force_metadata"], padding=scdl_args.get("tag_padding"))
+        postprocessors.append((mutagen_pp, "post_process"))
+
+    if dedupe_store:
+        # link the final file, after it has been converted and tagged
+        postprocessors.append((DedupeLinkPP(), "post_process"))
+
+    return postprocessors
+
+
+def _create_ydl(params: dict, postprocessors: list) -> YoutubeDL:
+    patches.apply_patches()
+    from yt_dlp import YoutubeDL
+
+    # YoutubeDL fills in the default output templates, so they are not shared either
+    ydl = YoutubeDL({**params, "outtmpl": dict(params.get("outtmpl") or {})})
+    for pp, when in postprocessors:
+        ydl.add_post_processor(pp, when)
+    return ydl
+
+
+def _build_download_params(scdl_args: SCDLArgs) -> tuple[dict, list]:
+    params, postprocessors = _build_ytdl_params(scdl_args)
 
     params["logger"] = logger
 
@@ -533,6 +832,10 @@ def download_url(url: str, **scdl_args: Unpack[SCDLArgs]) -> None:
     params["postprocessors"] = [
         pp for pp in params["postprocessors"] if pp["key"] not in ("EmbedThumbnail", "FFmpegMetadata")
     ]
+    # MutagenPP downloads the thumbnail into memory instead
+    params["writethumbnail"] = False
+    # counts of files whose tags were updated or unchanged, shared by all downloaders
+    params["scdl_tag_stats"] = collections.Counter()
 
     yt_dlp_args = scdl_args.get("yt_dlp_args")
     if yt_dlp_args:
@@ -540,15 +843,123 @@ def download_url(url: str, **scdl_args: Unpack[SCDLArgs]) -> None:
         overrides = utils.cli_to_api(argv)
         params = {**params, **overrides}
 
-    with YoutubeDL(params) as ydl:
+    return params, postprocessors
+
+
+def _create_retag_ydl(scdl_args: SCDLArgs) -> YoutubeDL:
+    from scdl.patches.switch_outtmpl_preprocessor import OuttmplPP
+
+    params, _ = _build_download_params(scdl_args)
+    # files are reported by scdl retag
+    params["logger"] = None
+    params["quiet"] = not scdl_args.get("debug")
+    outtmpl_pp = OuttmplPP(_build_ytdl_output_filename(scdl_args, False), _build_ytdl_output_filename(scdl_args, True))
+    return _create_ydl(params, [(outtmpl_pp, "pre_process")])
+
+
+def download_url(url: str, **scdl_args: Unpack[SCDLArgs]) -> None:
+    _download_urls([url], scdl_args, ignore_errors=False)
+
+
+def download_urls(urls: Iterable[str], **scdl_args: Unpack[SCDLArgs]) -> dict[str, int]:
+    """Download many URLs with the same options, reusing a single YoutubeDL.
+
+    A failing URL does not stop the remaining ones.
+    Returns the exit status of each URL (0 on success).
+    """
+    return _download_urls(urls, scdl_args, ignore_errors=True)
+
+
+def _download_job(url: str, scdl_args: SCDLArgs, progress_hooks: list[Callable[[dict], None]]) -> int:
+    return _download_urls([url], scdl_args, ignore_errors=True, progress_hooks=progress_hooks)[url]
+
+
+def _download_urls(
+    urls: Iterable[str],
+    scdl_args: SCDLArgs,
+    ignore_errors: bool,
+    progress_hooks: Iterable[Callable[[dict], None]] = (),
+) -> dict[str, int]:
+    from yt_dlp.utils import DownloadCancelled, DownloadError
+
+    from scdl.patches.concurrent_download import ConcurrentDownloadHelper
+    from scdl.patches.incremental_feed import IncrementalFeedHelper
+    from scdl.patches.sync_download_archive import SyncDownloadHelper
+
+    params, postprocessors = _build_download_params(scdl_args)
+
+    cache = _open_metadata_cache(scdl_args.get("cache_dir"))
+    if cache:
+        # used by the patched SoundCloud extractor and MutagenPP
+        params["scdl_metadata_cache"] = cache
+
+    if scdl_args.get("scan_path") and scdl_args.get("name_format") != "-":
+        from scdl.patches.existing_files import FileIndex
+
+        # used by the patched YoutubeDL and FileDownloader to check which files exist
+        file_index = FileIndex(str(scdl_args["path"]))
+        logger.debug(f"[debug] Found {file_index.scan()} files in {scdl_args['path']}")
+        params["scdl_file_index"] = file_index
+
+    statuses: dict[str, int] = {}
+    with _create_ydl(params, postprocessors) as ydl:
         if scdl_args["client_id"]:
             ydl.cache.store("soundcloud", "client_id", scdl_args["client_id"])
-        for pp, when in postprocessors:
-            ydl.add_post_processor(pp, when)
+        for hook in progress_hooks:
+            ydl.add_progress_hook(hook)
 
         sync = SyncDownloadHelper(scdl_args, ydl)
-        ydl.download(url)
-        sync.post_download()
+        feeds = IncrementalFeedHelper(scdl_args, ydl, cache)
+        concurrent = ConcurrentDownloadHelper(
+            scdl_args,
+            ydl,
+            lambda: _create_ydl(params, _build_ytdl_postprocessors(scdl_args)),
+        )
+        try:
+            for url in urls:
+                ydl_url = _build_ytdl_url(url, scdl_args)
+                logger.debug(f"[debug] Downloading {ydl_url}")
+                ydl._download_retcode = 0
+                try:
+                    try:
+                        if scdl_args.get("sync_plan"):
+                            sync.add_to_plan(ydl_url)
+                        else:
+                            ydl.download(ydl_url)
+                    finally:
+                        # also raises failures of tracks downloaded concurrently
+                        concurrent.post_download()
+                except DownloadCancelled:
+                    if not ignore_errors:
+                        raise
+                    # the url was not listed completely, e.g. a cancelled job or --max-downloads
+                    ydl._download_retcode = 1
+                except Exception as err:
+                    if not ignore_errors:
+                        raise
+                    # yt-dlp has already reported its own errors
+                    if not isinstance(err, DownloadError):
+                        logger.error(f"[scdl] Error while downloading {url}: {err}")
+                    ydl._download_retcode = 1
+                feeds.post_download()
+                statuses[url] = ydl._download_retcode
+        finally:
+            concurrent.close()
+            if cache:
+                if ydl.cache.enabled and ydl.cache.load("soundcloud", "client_id") != scdl_args["client_id"]:
+                    # yt-dlp replaced the client_id after a 401/403, so it is not valid anymore
+                    _forget_validation(cache, scdl_args["client_id"], None)
+                logger.debug(f"[debug] Metadata cache: {cache.stats()}")
+                cache.close()
+        if scdl_args.get("force_metadata"):
+            tag_stats = params["scdl_tag_stats"]
+            logger.info(
+                f"[scdl] Updated tags of {tag_stats['updated']} files, {tag_stats['unchanged']} unchanged, "
+                f"{tag_stats['rewritten']} rewritten completely"
+            )
+        sync.post_download(complete=not any(statuses.values()))
+
+    return statuses
 
 
 if __name__ == "__main__":
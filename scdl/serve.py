@@ -0,0 +1,290 @@
+"""Long-running scdl server accepting download jobs over a local HTTP API
+
+Endpoints:
+    GET    /jobs          List all jobs
+    POST   /jobs          Queue a job, body: {"url": "...", "options": {"onlymp3": true, ...}}
+    GET    /jobs/<id>     Get the status of a job
+    DELETE /jobs/<id>     Cancel a queued or running job
+
+Job options use the same names as the keyword arguments of `scdl.download_url`.
+
+Any web page open in a browser can send requests to a local server, so requests with an
+Origin header (sent by browsers with cross-site requests) or another Host than the server
+(DNS rebinding) are rejected, and jobs must be posted as application/json, which browsers
+cannot send cross-site without a preflight request.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable
+
+from yt_dlp.utils import DownloadCancelled, parse_bytes
+
+from scdl.utils import check_options
+
+logger = logging.getLogger("scdl.scdl")
+
+# options which only make sense for the server itself or are fixed by it
+_SERVER_OPTIONS = frozenset(
+    (
+        "apply_plan",
+        "auth_token",
+        "batch_file",
+        "cache_dir",
+        "client_id",
+        "directory",
+        "help",
+        "host",
+        "l",
+        "me",
+        "no_cache",
+        "port",
+        "retag",
+        "s",
+        "serve",
+        "sync_plan",
+        "version",
+        "workers",
+        # e.g. --exec runs arbitrary commands
+        "yt_dlp_args",
+    )
+)
+# hosts which always refer to the local machine
+_LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+class Job:
+    def __init__(self, id_: str, url: str, scdl_args: dict):
+        self.id = id_
+        self.url = url
+        self.scdl_args = scdl_args
+        self.status = "queued"
+        self.error: str | None = None
+        self.created = time.time()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.cancelled = threading.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "url": self.url,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobServer:
+    """Runs download jobs on a bounded pool of worker threads.
+
+    `download` is called as `download(url, scdl_args, progress_hooks)` and returns the
+    exit status of the download.
+    """
+
+    def __init__(
+        self,
+        base_args: dict,
+        download: Callable[..., int],
+        workers: int,
+    ):
+        self._base_args = base_args
+        self._download = download
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="scdl-job")
+        self._jobs: dict[str, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _build_args(self, options: dict) -> dict:
+        scdl_args = dict(self._base_args)
+        for key, value in options.items():
+            if key in _SERVER_OPTIONS or key not in self._base_args:
+                raise ValueError(f"Unsupported option: {key}")
+            if key in ("o", "jobs", "tag_workers", "fragment_concurrency"):
+                if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                    raise ValueError(f"{key} should be a positive integer")
+            elif key == "tag_padding":
+                # a number of bytes, or a size like on the command line, e.g. "64k"
+                value = parse_bytes(str(value))
+                if value is None:
+                    raise ValueError(f"{key} should be a size")
+            elif key in ("path", "dedupe_store"):
+                value = Path(value).resolve()
+            elif isinstance(self._base_args[key], bool) and not isinstance(value, bool):
+                raise ValueError(f"{key} should be a boolean")
+            scdl_args[key] = value
+        check_options(scdl_args)
+        return scdl_args
+
+    def submit(self, url: str, options: dict) -> Job:
+        scdl_args = self._build_args(options)
+        with self._lock:
+            job = Job(str(next(self._ids)), url, scdl_args)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        logger.info(f"[scdl] Queued job {job.id}: {url}")
+        return job
+
+    def _run(self, job: Job):
+        if job.cancelled.is_set():
+            return
+
+        def check_cancelled(_):
+            if job.cancelled.is_set():
+                raise DownloadCancelled(f"Job {job.id} cancelled")
+
+        job.status = "running"
+        job.started = time.time()
+        try:
+            status = self._download(job.url, job.scdl_args, [check_cancelled])
+        except Exception as err:
+            if job.cancelled.is_set():
+                job.status = "cancelled"
+            else:
+                job.status = "failed"
+                job.error = str(err)
+        else:
+            if job.cancelled.is_set():
+                job.status = "cancelled"
+            else:
+                job.status = "failed" if status else "finished"
+        job.finished = time.time()
+        logger.info(f"[scdl] Job {job.id} {job.status}: {job.url}")
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def all_jobs(self) -> list[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Job | None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job.cancelled.set()
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished = time.time()
+        return job
+
+    def shutdown(self):
+        for job in self.all_jobs():
+            self.cancel(job.id)
+        self._executor.shutdown(wait=True)
+
+    def create_server(self, host: str, port: int) -> ThreadingHTTPServer:
+        httpd = ThreadingHTTPServer((host, port), _JobRequestHandler)
+        httpd.jobs = self  # type: ignore[attr-defined]
+        httpd.allowed_hosts = _allowed_hosts(host, httpd.server_port)  # type: ignore[attr-defined]
+        return httpd
+
+    def serve_forever(self, host: str, port: int):
+        httpd = self.create_server(host, port)
+        logger.info(f"[scdl] Listening on http://{host}:{port}")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+            self.shutdown()
+
+
+def _allowed_hosts(host: str, port: int) -> frozenset[str]:
+    """Values of the Host header of requests to the server"""
+    hosts = {host, *_LOOPBACK_HOSTS} if host in _LOOPBACK_HOSTS else {host}
+    hosts = {f"[{name}]" if ":" in name else name for name in hosts}
+    allowed = {f"{name}:{port}" for name in hosts}
+    if port == 80:
+        allowed |= hosts
+    return frozenset(allowed)
+
+
+class _JobRequestHandler(BaseHTTPRequestHandler):
+    server_version = "scdl"
+
+    @property
+    def _jobs(self) -> JobServer:
+        return self.server.jobs  # type: ignore[attr-defined]
+
+    def log_message(self, format: str, *args: Any):
+        logger.debug("[debug] " + format % args)
+
+    def _send(self, status: HTTPStatus, body: Any):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _check_request(self) -> bool:
+        """Reject requests which may have been sent by a web page, returns whether the request is allowed"""
+        host = (self.headers.get("Host") or "").lower()
+        if self.headers.get("Origin") is not None or host not in self.server.allowed_hosts:  # type: ignore[attr-defined]
+            self._send(HTTPStatus.FORBIDDEN, {"error": "Forbidden"})
+            return False
+        return True
+
+    def _job_id(self) -> str | None:
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "jobs":
+            return parts[1]
+        return None
+
+    def do_GET(self):
+        if not self._check_request():
+            return
+        if self.path.rstrip("/") == "/jobs":
+            self._send(HTTPStatus.OK, [job.to_dict() for job in self._jobs.all_jobs()])
+            return
+        job_id = self._job_id()
+        job = self._jobs.get(job_id) if job_id else None
+        if job is None:
+            self._send(HTTPStatus.NOT_FOUND, {"error": "Job not found"})
+            return
+        self._send(HTTPStatus.OK, job.to_dict())
+
+    def do_POST(self):
+        if not self._check_request():
+            return
+        if self.path.rstrip("/") != "/jobs":
+            self._send(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+            return
+        if self.headers.get_content_type() != "application/json":
+            self._send(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, {"error": "Content-Type should be application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            url = body["url"]
+            options = body.get("options") or {}
+            if not isinstance(url, str) or not isinstance(options, dict):
+                raise TypeError("Invalid job")
+            job = self._jobs.submit(url, options)
+        except (KeyError, TypeError, ValueError) as err:
+            self._send(HTTPStatus.BAD_REQUEST, {"error": str(err)})
+            return
+        self._send(HTTPStatus.CREATED, job.to_dict())
+
+    def do_DELETE(self):
+        if not self._check_request():
+            return
+        job_id = self._job_id()
+        job = self._jobs.cancel(job_id) if job_id else None
+        if job is None:
+            self._send(HTTPStatus.NOT_FOUND, {"error": "Job not found"})
+            return
+        self._send(HTTPStatus.ACCEPTED, job.to_dict())
@@ -1,15 +1,21 @@
+import functools
+import threading
 from logging import Logger
 
-import yt_dlp
-import yt_dlp.options
+from scdl.patches import apply_patches
 
 """Copied from
 https://github.com/yt-dlp/yt-dlp/blob/0b6b7742c2e7f2a1fcb0b54ef3dd484bab404b3f/devscripts/cli_to_api.py
 """
-_create_parser = yt_dlp.options.create_parser
+# _parse_patched_options temporarily replaces the parser used by yt_dlp.parse_options
+_parse_lock = threading.Lock()
 
 
 def _parse_patched_options(opts):
+    import yt_dlp
+    import yt_dlp.options
+
+    _create_parser = yt_dlp.options.create_parser
     patched_parser = _create_parser()
     patched_parser.defaults.update(
         {
@@ -27,18 +33,51 @@ def _parse_patched_options(opts):
         yt_dlp.options.create_parser = _create_parser
 
 
-_default_opts = _parse_patched_options([]).ydl_opts
+@functools.cache
+def _get_default_opts():
+    return _parse_patched_options([]).ydl_opts
 
 
 def cli_to_api(opts):
-    opts = yt_dlp.parse_options(opts).ydl_opts
+    # options are built from the same scdl args for every URL of a batch or server job,
+    # so parse each set of options once. The result is copied since params get modified
+    return _copy_params(_cli_to_api(tuple(opts)))
+
+
+def _copy_params(value):
+    # only containers are copied, other values (e.g. the actions of MetadataParserPP)
+    # are compared by identity in yt-dlp and must stay the same objects
+    if type(value) is dict:
+        return {k: _copy_params(v) for k, v in value.items()}
+    if type(value) in (list, tuple, set):
+        return type(value)(map(_copy_params, value))
+    return value
+
 
-    diff = {k: v for k, v in opts.items() if _default_opts[k] != v}
+@functools.lru_cache(maxsize=64)
+def _cli_to_api(opts):
+    apply_patches()
+    import yt_dlp
+
+    with _parse_lock:
+        default_opts = _get_default_opts()
+        opts = yt_dlp.parse_options(list(opts)).ydl_opts
+
+    diff = {k: v for k, v in opts.items() if default_opts[k] != v}
     if "postprocessors" in diff:
-        diff["postprocessors"] = [pp for pp in diff["postprocessors"] if pp not in _default_opts["postprocessors"]]
+        diff["postprocessors"] = [pp for pp in diff["postprocessors"] if pp not in default_opts["postprocessors"]]
     return diff
 
 
+def check_options(scdl_args) -> None:
+    """Raise ValueError if scdl_args combines options which cannot be used together"""
+    if (scdl_args.get("sync_plan") or scdl_args.get("apply_plan")) and not scdl_args.get("sync"):
+        raise ValueError("--sync-plan and --apply-plan require --sync")
+    if scdl_args.get("dedupe_store") and scdl_args.get("sync"):
+        # removing a track of the sync would delete the stored file, which other playlists link to
+        raise ValueError("--dedupe-store cannot be used with --sync")
+
+
 class YTLogger(Logger):
     def debug(self, msg: object, *args, **kwargs):
         # For compatibility with youtube-dl, both debug and info are passed into debug
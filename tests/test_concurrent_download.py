@@ -0,0 +1,92 @@
+import http.server
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadError
+
+from scdl.patches.concurrent_download import ConcurrentDownloadHelper
+
+TRACKS = 8
+# the track which fails, while the first one is still downloading
+FAILING_TRACK = 2
+
+
+class _TrackHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        track = int(self.path.removeprefix("/").removesuffix(".mp3"))
+        if track == FAILING_TRACK:
+            self.send_error(404)
+            return
+        time.sleep(0.5 if track == 1 else 0.01)
+        body = bytes([track]) * 1024
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _playlist(port: int) -> dict:
+    return {
+        "_type": "playlist",
+        "id": "playlist",
+        "title": "playlist",
+        "extractor": "soundcloud:set",
+        "extractor_key": "SoundcloudSet",
+        "webpage_url": f"http://127.0.0.1:{port}/sets/playlist",
+        "entries": [
+            {
+                "id": str(i),
+                "title": f"track {i}",
+                "extractor": "soundcloud",
+                "extractor_key": "Soundcloud",
+                "webpage_url": f"http://127.0.0.1:{port}/",
+                "formats": [
+                    {
+                        "format_id": "http_mp3",
+                        "url": f"http://127.0.0.1:{port}/{i}.mp3",
+                        "protocol": "http",
+                        "ext": "mp3",
+                        "acodec": "mp3",
+                        "vcodec": "none",
+                    }
+                ],
+            }
+            for i in range(1, TRACKS + 1)
+        ],
+    }
+
+
+def test_strict_playlist_skips_pending_tracks(tmp_path: Path) -> None:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _TrackHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    archive = tmp_path / "archive.txt"
+    params = {
+        "quiet": True,
+        "noprogress": True,
+        "download_archive": str(archive),
+        "fixup": "never",
+        "outtmpl": {"default": f"{tmp_path}/%(id)s.%(ext)s"},
+    }
+    ydl = YoutubeDL(params)
+    concurrent = ConcurrentDownloadHelper({"jobs": 2}, ydl, lambda: YoutubeDL(params))
+    try:
+        # dispatching the playlist stops once the failure is seen
+        with pytest.raises(DownloadError):
+            ydl.process_ie_result(_playlist(server.server_port))
+        # and the failure is raised again once the tracks in flight are done
+        with pytest.raises(DownloadError):
+            concurrent.post_download()
+    finally:
+        concurrent.close()
+        server.shutdown()
+        server.server_close()
+
+    # the tracks queued behind the failure are not downloaded
+    assert archive.read_text(encoding="utf-8").splitlines() == ["soundcloud 1"]
+    assert sorted(path.name for path in tmp_path.glob("*.mp3")) == ["1.mp3"]
@@ -0,0 +1,122 @@
+import http.server
+import threading
+import time
+from pathlib import Path
+from typing import Optional, cast
+
+import pytest
+from docopt import docopt
+from yt_dlp import YoutubeDL
+
+from scdl import scdl
+from scdl.serve import JobServer
+
+SEGMENTS = 40
+SEGMENT_SIZE = 16 * 1024
+# round trip of each segment request, like a CDN far away
+LATENCY = 0.02
+CONCURRENCY = (1, 2, 4, 8)
+
+
+class _HLSHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # most segment requests being served at the same time
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self) -> None:
+        if self.path == "/playlist.m3u8":
+            lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:1", "#EXT-X-MEDIA-SEQUENCE:0"]
+            for i in range(SEGMENTS):
+                lines += ["#EXTINF:1.0,", f"/segment{i}.mp3"]
+            body = "\n".join([*lines, "#EXT-X-ENDLIST", ""]).encode()
+        else:
+            cls = type(self)
+            with cls.lock:
+                cls.in_flight += 1
+                cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            time.sleep(LATENCY)
+            with cls.lock:
+                cls.in_flight -= 1
+            index = int(self.path.removeprefix("/segment").removesuffix(".mp3"))
+            body = bytes([index]) * SEGMENT_SIZE
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _download(tmp_path: Path, port: int, concurrency: int) -> int:
+    """Download a track, returns the most segments requested at the same time"""
+    _HLSHandler.max_in_flight = 0
+    ydl = YoutubeDL(
+        {
+            "quiet": True,
+            "noprogress": True,
+            "concurrent_fragment_downloads": concurrency,
+            # the segments are not real mp3 frames
+            "fixup": "never",
+            "outtmpl": {"default": f"{tmp_path}/{concurrency}.%(ext)s"},
+        }
+    )
+    info = {
+        "id": str(concurrency),
+        "title": "track",
+        "extractor": "soundcloud",
+        "extractor_key": "Soundcloud",
+        "webpage_url": f"http://127.0.0.1:{port}/",
+        "formats": [
+            {
+                "format_id": "hls_mp3",
+                "url": f"http://127.0.0.1:{port}/playlist.m3u8",
+                "protocol": "m3u8_native",
+                "ext": "mp3",
+                "acodec": "mp3",
+                "vcodec": "none",
+            }
+        ],
+    }
+    with ydl:
+        ydl.process_ie_result(info)
+    return _HLSHandler.max_in_flight
+
+
+def test_fragment_concurrency(tmp_path: Path) -> None:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _HLSHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        in_flight = {concurrency: _download(tmp_path, server.server_port, concurrency) for concurrency in CONCURRENCY}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    expected = b"".join(bytes([i]) * SEGMENT_SIZE for i in range(SEGMENTS))
+    for concurrency in CONCURRENCY:
+        assert (tmp_path / f"{concurrency}.mp3").read_bytes() == expected
+    # segments are requested at the same time, up to the number of fragments at a time
+    assert in_flight[1] == 1
+    for concurrency in CONCURRENCY[1:]:
+        assert 1 < in_flight[concurrency] <= concurrency, in_flight
+
+
+@pytest.mark.parametrize(
+    ("argv", "options", "expected"),
+    [
+        ([], None, 4),
+        (["--fragment-concurrency", "8"], None, 8),
+        # a job of scdl serve
+        ([], {"fragment_concurrency": 2}, 2),
+    ],
+)
+def test_fragment_concurrency_option(tmp_path: Path, argv: list, options: Optional[dict], expected: int) -> None:
+    url = "https://soundcloud.com/one-thousand-and-one/test-track"
+    scdl_args = scdl._to_python_args(docopt(scdl.__doc__, argv=["-l", url, *argv]))
+    scdl_args.update(path=tmp_path, name_format="{title}", playlist_name_format="{title}")
+    if options is not None:
+        scdl_args = JobServer(scdl_args, scdl._download_job, 1)._build_args(options)
+    params, _ = scdl._build_ytdl_params(cast("scdl.SCDLArgs", scdl_args))
+    assert params["concurrent_fragment_downloads"] == expected
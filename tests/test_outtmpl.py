@@ -0,0 +1,102 @@
+import collections
+import http.server
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import scdl.patches
+from scdl.patches import original_filename_preprocessor
+from scdl.patches.original_filename_preprocessor import OriginalFilenamePP
+from scdl.patches.switch_outtmpl_preprocessor import OuttmplPP
+
+TRACKS = 64
+THREADS = 16
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def _send_headers(self) -> bytes:
+        track_id = self.path.strip("/")
+        body = track_id.encode()
+        self.send_response(200)
+        if int(track_id) % 2:
+            self.send_header("Content-Disposition", f'attachment; filename="original {track_id}.wav"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        return body
+
+    def do_HEAD(self) -> None:
+        self._send_headers()
+
+    def do_GET(self) -> None:
+        self.wfile.write(self._send_headers())
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _info(track_id: int, port: int) -> dict:
+    url = f"http://127.0.0.1:{port}/{track_id}"
+    info: dict = {
+        "id": str(track_id),
+        "title": f"track {track_id}",
+        "extractor": "soundcloud",
+        "extractor_key": "Soundcloud",
+        "webpage_url": url,
+        "formats": [{"format_id": "download", "url": url, "ext": "wav", "acodec": "pcm", "vcodec": "none"}],
+    }
+    if track_id % 3:
+        info.update(playlist=f"playlist {track_id % 3}", playlist_uploader="uploader", playlist_index=track_id)
+    return info
+
+
+def _expected_path(tmp_path: Path, track_id: int) -> Path:
+    name = f"original {track_id}.wav" if track_id % 2 else f"track {track_id}.wav"
+    if track_id % 3:
+        return tmp_path / f"playlist {track_id % 3}" / name
+    return tmp_path / name
+
+
+def test_concurrent_outtmpl(tmp_path: Path) -> None:
+    scdl.patches.apply_patches()
+    from yt_dlp import YoutubeDL
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # every track is downloaded by the same YoutubeDL
+        ydl = YoutubeDL({"quiet": True, "noprogress": True, "format": "download"})
+        ydl.add_post_processor(
+            OuttmplPP(f"{tmp_path}/%(title)s.%(ext)s", f"{tmp_path}/%(playlist)s/%(title)s.%(ext)s"), "pre_process"
+        )
+        ydl.add_post_processor(OriginalFilenamePP(), "pre_process")
+        with ThreadPoolExecutor(THREADS) as pool:
+            list(pool.map(lambda i: ydl.process_ie_result(_info(i, server.server_port)), range(TRACKS)))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for track_id in range(TRACKS):
+        assert _expected_path(tmp_path, track_id).read_text() == str(track_id)
+    assert len(list(tmp_path.rglob("*.wav"))) == TRACKS
+
+
+def test_original_filenames_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(original_filename_preprocessor, "_MAX_FILENAMES", 8)
+    monkeypatch.setattr(original_filename_preprocessor, "_filenames", collections.OrderedDict())
+    pp = OriginalFilenamePP()
+    requests = []
+
+    def request_filename(format: dict) -> str:
+        requests.append(format)
+        return f"{format['id']}.wav"
+
+    monkeypatch.setattr(pp, "_request_filename", request_filename)
+
+    for i in range(100):
+        assert pp._get_filename(str(i), {"id": i}) == f"{i}.wav"
+    # recent tracks are not requested again
+    assert pp._get_filename("99", {"id": 99}) == "99.wav"
+    assert len(requests) == 100
+    assert len(original_filename_preprocessor._filenames) == 8
@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 
@@ -153,3 +154,107 @@ def test_sync(tmp_path: Path) -> None:
             "1855267053",
             "1855318536",
         ]
+
+
+def test_sync_plan(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    with open("archive.txt", "w", encoding="utf-8") as f:
+        f.writelines(["soundcloud 1032303631 remove_this.mp3\n"])
+    args = (
+        "-l",
+        "https://soundcloud.com/one-thousand-and-one/sets/test-playlist/s-ZSLfNrbPoXR",
+        "--playlist-name-format",
+        "{playlist[tracknumber]}_{title}",
+        "--onlymp3",
+        "--sync",
+        "archive.txt",
+    )
+    r = call_scdl_with_auth(*args, "--sync-plan", "plan.json")
+    assert r.returncode == 0
+    with open("plan.json", encoding="utf-8") as f:
+        plan = json.load(f)
+    assert sorted(track["id"] for track in plan["add"]) == ["soundcloud 1855267053", "soundcloud 1855318536"]
+    assert plan["remove"] == [{"id": "soundcloud 1032303631", "filename": "remove_this.mp3"}]
+    assert not list(tmp_path.rglob("*.mp3"))
+
+    r = call_scdl_with_auth(*args, "--apply-plan", "plan.json")
+    assert r.returncode == 0
+    assert_track_playlist_1(tmp_path)
+    assert_track_playlist_2(tmp_path)
+    with open("archive.txt") as f:
+        assert sorted(line.split()[1] for line in f.read().splitlines()) == ["1855267053", "1855318536"]
+
+
+def test_jobs(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    r = call_scdl_with_auth(
+        "-l",
+        "https://soundcloud.com/one-thousand-and-one/sets/test-playlist/s-ZSLfNrbPoXR",
+        "--playlist-name-format",
+        "{playlist[tracknumber]}_{title}",
+        "--onlymp3",
+        "--jobs",
+        "2",
+    )
+    assert r.returncode == 0
+    assert_track_playlist_1(tmp_path)
+    assert_track_playlist_2(tmp_path)
+
+
+def test_pipeline(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    r = call_scdl_with_auth(
+        "-l",
+        "https://soundcloud.com/one-thousand-and-one/sets/test-playlist/s-ZSLfNrbPoXR",
+        "--playlist-name-format",
+        "{playlist[tracknumber]}_{title}",
+        "--onlymp3",
+        "--pipeline",
+    )
+    assert r.returncode == 0
+    assert_track_playlist_1(tmp_path)
+    assert_track_playlist_2(tmp_path)
+
+
+def test_tag_workers(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    r = call_scdl_with_auth(
+        "-l",
+        "https://soundcloud.com/one-thousand-and-one/sets/test-playlist/s-ZSLfNrbPoXR",
+        "--playlist-name-format",
+        "{playlist[tracknumber]}_{title}",
+        "--onlymp3",
+        "--tag-workers",
+        "2",
+    )
+    assert r.returncode == 0
+    assert_track_playlist_1(tmp_path)
+    assert_track_playlist_2(tmp_path)
+
+
+def test_dedupe_store(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    r = call_scdl_with_auth(
+        "-l",
+        "https://soundcloud.com/one-thousand-and-one/sets/test-playlist/s-ZSLfNrbPoXR",
+        "--playlist-name-format",
+        "{playlist[tracknumber]}_{title}",
+        "--onlymp3",
+        "--dedupe-store",
+        "store",
+    )
+    assert r.returncode == 0
+    r = call_scdl_with_auth(
+        "-l",
+        "https://soundcloud.com/one-thousand-and-one/test-track",
+        "--name-format",
+        "track",
+        "--onlymp3",
+        "--dedupe-store",
+        "store",
+    )
+    assert r.returncode == 0
+    assert_track_playlist_2(tmp_path, check_metadata=False)
+    assert_track(tmp_path, "track.mp3")
+    assert sorted(file.name for file in (tmp_path / "store").iterdir()) == ["1855267053.mp3", "1855318536.mp3"]
+    assert (tmp_path / "test playlist" / "1_testing - test track.mp3").samefile(tmp_path / "track.mp3")
@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Optional
+
+from tests.utils import assert_track, client_id
+
+PORT = 8765
+
+
+def request(method: str, path: str, body: Optional[dict] = None) -> tuple[int, dict]:
+    data = json.dumps(body).encode() if body is not None else None
+    headers = {"Content-Type": "application/json"}
+    req = urllib.request.Request(f"http://127.0.0.1:{PORT}{path}", data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(req) as res:
+            return res.status, json.load(res)
+    except urllib.error.HTTPError as err:
+        return err.code, json.load(err)
+
+
+def wait_for_job(job_id: str, timeout: float = 60) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        _, job = request("GET", f"/jobs/{job_id}")
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.5)
+    raise TimeoutError(job_id)
+
+
+def test_serve(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    args = ["scdl", "serve", "--port", str(PORT), "--client-id", client_id]
+    if os.getenv("AUTH_TOKEN"):
+        args += ["--auth-token", os.environ["AUTH_TOKEN"]]
+    server = subprocess.Popen(args, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(50):
+            try:
+                request("GET", "/jobs")
+                break
+            except urllib.error.URLError:
+                time.sleep(0.2)
+
+        status, job = request(
+            "POST",
+            "/jobs",
+            {
+                "url": "https://soundcloud.com/one-thousand-and-one/test-track",
+                "options": {"name_format": "track", "onlymp3": True},
+            },
+        )
+        assert status == 201
+        assert wait_for_job(job["id"])["status"] == "finished"
+        assert_track(tmp_path, "track.mp3")
+
+        status, job = request("POST", "/jobs", {"url": "https://soundcloud.com", "options": {"me": True}})
+        assert status == 400
+    finally:
+        server.terminate()
+        server.wait()
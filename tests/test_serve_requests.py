@@ -0,0 +1,111 @@
+import contextlib
+import http.client
+import json
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional
+
+import pytest
+from docopt import docopt
+from yt_dlp import YoutubeDL
+
+from scdl import scdl
+from scdl.serve import JobServer
+
+
+@contextlib.contextmanager
+def serve(jobs: JobServer) -> Iterator[int]:
+    httpd = jobs.create_server("127.0.0.1", 0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        yield httpd.server_port
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        jobs.shutdown()
+
+
+@pytest.fixture
+def port(tmp_path: Path) -> Iterator[int]:
+    base_args = {"onlymp3": False, "path": tmp_path, "yt_dlp_args": None, "sync": None, "dedupe_store": None}
+    with serve(JobServer(base_args, lambda *_: 0, 1)) as port:
+        yield port
+
+
+def post_job(port: int, body: dict, headers: Optional[dict] = None) -> int:
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    try:
+        conn.request("POST", "/jobs", json.dumps(body), {"Content-Type": "application/json", **(headers or {})})
+        return conn.getresponse().status
+    finally:
+        conn.close()
+
+
+def request(port: int, method: str, path: str) -> dict:
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    try:
+        conn.request(method, path)
+        return json.load(conn.getresponse())
+    finally:
+        conn.close()
+
+
+def test_accepts_job(port: int) -> None:
+    assert post_job(port, {"url": "https://soundcloud.com/one-thousand-and-one/test-track"}) == 201
+    body = {"url": "https://soundcloud.com/a", "options": {"onlymp3": True}}
+    assert post_job(port, body, {"Host": f"localhost:{port}"}) == 201
+
+
+@pytest.mark.parametrize("content_type", ["text/plain", "application/x-www-form-urlencoded", ""])
+def test_rejects_content_type(port: int, content_type: str) -> None:
+    assert post_job(port, {"url": "https://soundcloud.com/a"}, {"Content-Type": content_type}) == 415
+
+
+def test_rejects_origin(port: int) -> None:
+    assert post_job(port, {"url": "https://soundcloud.com/a"}, {"Origin": "https://example.com"}) == 403
+
+
+def test_rejects_host(port: int) -> None:
+    assert post_job(port, {"url": "https://soundcloud.com/a"}, {"Host": f"example.com:{port}"}) == 403
+
+
+def test_rejects_yt_dlp_args(port: int) -> None:
+    body = {"url": "https://soundcloud.com/a", "options": {"yt_dlp_args": "--exec 'touch pwned'"}}
+    assert post_job(port, body) == 400
+
+
+def test_rejects_dedupe_store_with_sync(port: int, tmp_path: Path) -> None:
+    options = {"sync": str(tmp_path / "sync.txt"), "dedupe_store": str(tmp_path / "store")}
+    assert post_job(port, {"url": "https://soundcloud.com/a", "options": options}) == 400
+
+
+def test_cancel_sync_job(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    song = tmp_path / "song.mp3"
+    song.write_bytes(b"")
+    sync_file = tmp_path / "sync.txt"
+    sync_file.write_text(f"soundcloud 1 {song}\n", encoding="utf-8")
+
+    def download(self: YoutubeDL, *_: object) -> int:
+        # a track of the playlist downloading until the job is cancelled
+        while True:
+            for hook in self._progress_hooks:
+                hook({"status": "downloading", "filename": str(tmp_path / "new.mp3"), "info_dict": {"id": "2"}})
+            time.sleep(0.01)
+
+    monkeypatch.setattr(YoutubeDL, "download", download)
+    url = "https://soundcloud.com/one-thousand-and-one/sets/test-playlist"
+    base_args = scdl._to_python_args(docopt(scdl.__doc__, argv=["-l", url]))
+    base_args.update(path=tmp_path, name_format="{title}", playlist_name_format="{title}")
+    with serve(JobServer(base_args, scdl._download_job, 1)) as port:
+        assert post_job(port, {"url": url, "options": {"sync": str(sync_file)}}) == 201
+        while request(port, "GET", "/jobs/1")["status"] == "queued":
+            time.sleep(0.01)
+        request(port, "DELETE", "/jobs/1")
+        while (job := request(port, "GET", "/jobs/1"))["status"] == "running":
+            time.sleep(0.01)
+
+    assert job["status"] == "cancelled"
+    assert song.exists()
+    assert sync_file.read_text(encoding="utf-8") == f"soundcloud 1 {song}\n"
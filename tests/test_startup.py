@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+# --help and --version must not wait for these
+HEAVY_MODULES = ("curl_cffi", "mutagen", "soundcloud", "yt_dlp")
+# importing scdl.scdl takes about 50ms, compared to 350ms when it imported yt-dlp
+IMPORT_TIME_BUDGET_US = 150_000
+
+
+def import_times(module: str) -> dict[str, int]:
+    r = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        encoding="utf-8",
+        check=True,
+    )
+    times = {}
+    for line in r.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_time() -> None:
+    times = import_times("scdl.scdl")
+    heavy = [name for name in times if name.split(".")[0] in HEAVY_MODULES]
+    assert not heavy
+    assert times["scdl.scdl"] < IMPORT_TIME_BUDGET_US
+
+
+def test_version() -> None:
+    r = subprocess.run(["scdl", "--version"], capture_output=True, encoding="utf-8", check=False)
+    assert r.returncode == 0
+    assert r.stdout.strip()
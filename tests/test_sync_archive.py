@@ -0,0 +1,87 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from docopt import docopt
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadError, MaxDownloadsReached
+
+from scdl import scdl
+from scdl.patches.sync_download_archive import SyncArchive, SyncDownloadHelper
+
+ENTRIES = 1_000_000
+# each entry took about 440 bytes when stored as strings and Path objects, it now takes under 200
+BYTES_PER_ENTRY_BUDGET = 250
+
+LOAD_SYNC_FILE = """
+import json, resource, sys, time
+import scdl.patches
+scdl.patches.apply_patches()
+from yt_dlp import YoutubeDL
+from scdl.patches.sync_download_archive import SyncDownloadHelper
+ydl = YoutubeDL({"quiet": True})
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+sync = SyncDownloadHelper({"sync": sys.argv[1]}, ydl)
+elapsed = time.perf_counter() - start
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+found = all(f"soundcloud {100_000_000 + i}" in ydl.archive for i in range(0, 1000, 7))
+print(json.dumps({"kb": after - before, "seconds": elapsed, "found": found}))
+"""
+
+
+def test_large_sync_file(tmp_path: Path) -> None:
+    # memory usage is measured with resource, which is not available on Windows
+    pytest.importorskip("resource")
+    sync_file = tmp_path / "archive.txt"
+    with open(sync_file, "w", encoding="utf-8") as f:
+        f.writelines(
+            f"soundcloud {100_000_000 + i} /home/user/Music/SoundCloud/Playlist {i % 20}/{i:07d} Artist - Title.mp3\n"
+            for i in range(ENTRIES)
+        )
+    r = subprocess.run(
+        [sys.executable, "-c", LOAD_SYNC_FILE, str(sync_file)],
+        capture_output=True,
+        encoding="utf-8",
+        check=True,
+    )
+    result = json.loads(r.stdout)
+    assert result["found"]
+    assert result["kb"] * 1024 / ENTRIES < BYTES_PER_ENTRY_BUDGET, (
+        f"loaded {ENTRIES} entries in {result['seconds']:.2f}s using {result['kb'] // 1024}MB"
+    )
+
+
+# a url which failed, or was cancelled (e.g. by --max-downloads or DELETE /jobs/<id>) before being listed completely
+@pytest.mark.parametrize("error", [DownloadError("Unable to download JSON metadata"), MaxDownloadsReached()])
+def test_sync_keeps_tracks_of_failed_urls(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, error: Exception) -> None:
+    song = tmp_path / "song.mp3"
+    song.write_bytes(b"")
+    sync_file = tmp_path / "sync.txt"
+    sync_file.write_text(f"soundcloud 1 {song}\n", encoding="utf-8")
+
+    def download(*_: object) -> int:
+        raise error
+
+    monkeypatch.setattr(YoutubeDL, "download", download)
+    url = "https://soundcloud.com/one-thousand-and-one/sets/test-playlist"
+    scdl_args = scdl._to_python_args(docopt(scdl.__doc__, argv=["-l", url]))
+    scdl_args.update(path=tmp_path, sync=str(sync_file), name_format="{title}", playlist_name_format="{title}")
+    statuses = scdl.download_urls([url], **scdl_args)
+
+    assert statuses == {url: 1}
+    assert song.exists()
+    assert sync_file.read_text(encoding="utf-8") == f"soundcloud 1 {song}\n"
+
+
+def test_append_after_missing_newline(tmp_path: Path) -> None:
+    sync_file = tmp_path / "sync.txt"
+    sync_file.write_text("soundcloud 1 a.mp3", encoding="utf-8")
+    sync = SyncDownloadHelper({"sync": str(sync_file)}, YoutubeDL({"quiet": True}))
+    sync._append(["soundcloud 2 b.mp3"])
+
+    archive = SyncArchive()
+    assert archive.load(sync_file, pytest.fail) == 2
+    assert dict(archive.items()) == {1: "a.mp3", 2: "b.mp3"}
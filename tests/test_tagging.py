@@ -0,0 +1,161 @@
+import struct
+import time
+from pathlib import Path
+from unittest import mock
+
+import mutagen
+import pytest
+from docopt import docopt
+from mutagen.ogg import OggPage
+from yt_dlp import YoutubeDL
+
+from scdl import retag, scdl
+from scdl.patches.dedupe_store import STORED_KEY
+from scdl.patches.mutagen_postprocessor import MutagenPP
+
+ROUNDS = 200
+# tagging a file takes well under 1ms here, most of it in mutagen loading and saving the file
+TAGGING_BUDGET_US = 5_000
+
+INFO = {
+    "id": "1855267053",
+    "title": "testing - test track",
+    "uploader": "7x11x13-testing",
+    "upload_date": "20240601",
+    "description": "test description",
+    "webpage_url": "https://soundcloud.com/one-thousand-and-one/test-track",
+    "genre": "Testing",
+    "playlist": "test playlist",
+    "meta_album": "test playlist",
+    "meta_album_artist": "7x11x13-testing",
+    "meta_track": "1",
+    # yt-dlp info dicts are large, most fields are not tags
+    **{f"field_{i}": i for i in range(200)},
+}
+
+
+def _atom(name: bytes, data: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(data), name) + data
+
+
+def _ogg_page(sequence: int, position: int, packet: bytes, first: bool = False, last: bool = False) -> bytes:
+    page = OggPage()
+    page.serial = 1
+    page.sequence = sequence
+    page.position = position
+    page.first = first
+    page.last = last
+    page.packets = [packet]
+    return page.write()
+
+
+def write_sample(path: Path) -> None:
+    """Write the smallest file of each format which mutagen can tag"""
+    if path.suffix == ".mp3":
+        # MPEG-1 layer 3, 128kbps, 44.1kHz
+        data = (b"\xff\xfb\x90\x00" + b"\x00" * 413) * 20
+    elif path.suffix == ".flac":
+        streaminfo = struct.pack(">HH", 4096, 4096) + b"\x00" * 6
+        streaminfo += ((44100 << 44) | (1 << 41) | (15 << 36) | 44100).to_bytes(8, "big") + b"\x00" * 16
+        data = b"fLaC" + bytes([0x80, 0, 0, len(streaminfo)]) + streaminfo
+    elif path.suffix == ".m4a":
+        mvhd = _atom(b"mvhd", b"\x00" * 4 + struct.pack(">IIII", 0, 0, 1000, 0) + b"\x00" * 80)
+        data = _atom(b"ftyp", b"M4A \x00\x00\x00\x00M4A isom") + _atom(b"moov", mvhd) + _atom(b"mdat", b"\x00" * 100)
+    else:
+        head = b"OpusHead" + struct.pack("<BBHIhB", 1, 2, 312, 48000, 0, 0)
+        tags = b"OpusTags" + struct.pack("<I", 4) + b"test" + struct.pack("<I", 0)
+        data = _ogg_page(0, 0, head, first=True) + _ogg_page(1, 0, tags) + _ogg_page(2, 960, b"\xfc\xff\xfe", last=True)
+    path.write_bytes(data)
+
+
+@pytest.mark.parametrize("ext", ["mp3", "m4a", "opus", "flac"])
+def test_tagging_speed(tmp_path: Path, ext: str) -> None:
+    pp = MutagenPP(True)
+    paths = [tmp_path / f"{i}.{ext}" for i in range(2)]
+    for path in paths:
+        write_sample(path)
+
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        # change the title so that every round rewrites the tags
+        info = {**INFO, "title": f"testing - test track {i}"}
+        assert pp._embed_metadata(str(paths[i % 2]), pp._get_metadata_dict(info)["common"])
+    per_file_us = (time.perf_counter() - start) / ROUNDS * 1_000_000
+
+    assert f"testing - test track {ROUNDS - 2}" in mutagen.File(paths[0]).pprint()
+    assert per_file_us < TAGGING_BUDGET_US, f"{ext}: {per_file_us:.0f}us per file"
+
+
+@pytest.mark.parametrize("ext", ["mp3", "m4a", "opus", "flac"])
+def test_tag_padding(tmp_path: Path, ext: str) -> None:
+    path = tmp_path / f"track.{ext}"
+    write_sample(path)
+    pp = MutagenPP(True, padding=64 * 1024)
+    assert pp._embed_metadata(str(path), pp._get_metadata_dict(INFO)["common"])
+    size = path.stat().st_size
+
+    # a larger tag fits into the padding, so the file is changed in place
+    info = {**INFO, "description": "test description " * 1000}
+    with mock.patch.object(pp, "to_screen") as to_screen:
+        assert pp._embed_metadata(str(path), pp._get_metadata_dict(info)["common"])
+    to_screen.assert_not_called()
+    assert path.stat().st_size == size
+
+
+@pytest.mark.parametrize("ext", ["mp3", "m4a", "opus", "flac"])
+def test_unchanged_tags(tmp_path: Path, ext: str) -> None:
+    path = tmp_path / f"track.{ext}"
+    write_sample(path)
+    pp = MutagenPP(True)
+    metadata = pp._get_metadata_dict(INFO)["common"]
+    metadata["thumbnail"] = {"data": b"\x89PNG\r\n\x1a\n" + b"\x00" * 64, "type": "png"}
+    assert pp._embed_metadata(str(path), dict(metadata))
+    mtime = path.stat().st_mtime_ns
+
+    # tagging again with the same metadata does not write the file
+    assert not pp._embed_metadata(str(path), dict(metadata))
+    assert path.stat().st_mtime_ns == mtime
+
+
+class _Cache:
+    def __init__(self) -> None:
+        self.tracks: list[tuple[int, str, dict]] = []
+
+    def set_track(self, track_id: int, filename: str, info: dict) -> None:
+        self.tracks.append((track_id, filename, info))
+
+
+@pytest.mark.parametrize(
+    ("real_download", "post_overwrites", "stored"), [(True, False, 1), (False, False, 0), (False, True, 1)]
+)
+def test_store_track(tmp_path: Path, real_download: bool, post_overwrites: bool, stored: int) -> None:
+    path = tmp_path / "track.mp3"
+    write_sample(path)
+    cache = _Cache()
+    pp = MutagenPP(post_overwrites, YoutubeDL({"quiet": True, "scdl_metadata_cache": cache}))
+    info = {**INFO, "filepath": str(path), "ext": "mp3", "__real_download": real_download}
+
+    pp.run(dict(info))
+    # the tags are already up to date, so a track which was not downloaded again is not stored again
+    pp.run(dict(info))
+    assert len(cache.tracks) == stored * (2 if real_download else 1)
+
+
+@pytest.mark.parametrize("in_store", [False, True])
+def test_retag_dedupe_store(tmp_path: Path, in_store: bool) -> None:
+    path = tmp_path / "1855267053.mp3"
+    write_sample(path)
+    scdl_args = scdl._to_python_args(docopt(scdl.__doc__, argv=["retag", str(tmp_path)]))
+    scdl_args.update(path=tmp_path, name_format="{title}", playlist_name_format="{title}")
+    retag._init_worker(scdl_args, scdl._create_retag_ydl)
+    # like the info stored by MutagenPP for a track downloaded from a playlist
+    info = {key: value for key, value in INFO.items() if not key.startswith("meta")}
+    info.update(playlist_uploader="7x11x13-testing", playlist_index=1)
+    if in_store:
+        info[STORED_KEY] = True
+
+    assert retag._retag_file((str(path), info)) == (str(path), "updated", None)
+    tags = mutagen.File(path).tags
+    assert "TIT2" in tags
+    # a file of --dedupe-store is shared by all playlists of the track
+    assert ("TALB" in tags, "TRCK" in tags) == (not in_store, not in_store)
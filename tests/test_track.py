@@ -1,4 +1,5 @@
 import os
+import subprocess
 from pathlib import Path
 
 import pytest
@@ -267,6 +268,30 @@ def test_extract_artist(tmp_path: Path) -> None:
     assert_track(tmp_path, "track.mp3", "test track", "testing")
 
 
+def test_retag(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    r = call_scdl_with_auth(
+        "-l",
+        "https://soundcloud.com/one-thousand-and-one/test-track",
+        "--onlymp3",
+        "--name-format",
+        "track",
+        "--cache-dir",
+        "cache",
+    )
+    assert r.returncode == 0
+    assert_track(tmp_path, "track.mp3")
+    r = subprocess.run(
+        ["scdl", "retag", str(tmp_path), "--cache-dir", "cache", "--extract-artist"],
+        capture_output=True,
+        encoding="utf-8",
+        check=False,
+    )
+    assert r.returncode == 0
+    assert_track(tmp_path, "track.mp3", "test track", "testing")
+    assert not (tmp_path / ".scdl-retag").exists()
+
+
 def test_maxsize(tmp_path: Path) -> None:
     os.chdir(tmp_path)
     r = call_scdl_with_auth(
@@ -335,6 +360,23 @@ def test_overwrite(tmp_path: Path) -> None:
     assert "Deleting existing file" in r.stderr
 
 
+def test_scan_path(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    args = ("-l", "https://soundcloud.com/one-thousand-and-one/test-track", "--name-format", "track", "--onlymp3")
+    r = call_scdl_with_auth(*args, "--scan-path")
+    assert r.returncode == 0
+    assert_track(tmp_path, "track.mp3", check_metadata=False)
+
+    r = call_scdl_with_auth(*args, "--scan-path")
+    assert r.returncode == 0
+    assert "has already been downloaded" in r.stderr
+
+    r = call_scdl_with_auth(*args, "--scan-path", "--overwrite")
+    assert r.returncode == 0
+    assert "Deleting existing file" in r.stderr
+    assert_track(tmp_path, "track.mp3", check_metadata=False)
+
+
 def test_path(tmp_path: Path) -> None:
     r = call_scdl_with_auth(
         "-l",
@@ -374,6 +416,30 @@ def test_download_archive(tmp_path: Path) -> None:
     assert "already been recorded in the archive" in r.stderr
 
 
+def test_old_download_archive(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    args = (
+        "-l",
+        "https://soundcloud.com/one-thousand-and-one/test-track",
+        "--name-format",
+        "track",
+        "--onlymp3",
+        "--download-archive=archive.txt",
+    )
+    r = call_scdl_with_auth(*args)
+    assert r.returncode == 0
+    os.remove("track.mp3")
+    # old versions of scdl only wrote the track id
+    with open("archive.txt", encoding="utf-8") as f:
+        ids = [line.split()[1] for line in f.read().splitlines()]
+    with open("archive.txt", "w", encoding="utf-8") as f:
+        f.writelines(f"{id_}\n" for id_ in ids)
+    r = call_scdl_with_auth(*args)
+    assert r.returncode == 0
+    assert "already been recorded in the archive" in r.stderr
+    assert not os.path.exists("track.mp3")
+
+
 def test_description_file(tmp_path: Path) -> None:
     os.chdir(tmp_path)
     r = call_scdl_with_auth(
@@ -402,3 +468,58 @@ def test_trim_filenames(tmp_path: Path) -> None:
     )
     assert r.returncode == 0
     assert_track(tmp_path, "a" * 240 + ".mp3")
+
+
+def test_batch_file(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    with open("urls.txt", "w", encoding="utf-8") as f:
+        f.write("# tracks to download\n")
+        f.write("https://soundcloud.com/one-thousand-and-one/test-track\n")
+        f.write("https://soundcloud.com/one-thousand-and-one/this-track-does-not-exist\n")
+    r = call_scdl_with_auth(
+        "--batch-file",
+        "urls.txt",
+        "--name-format",
+        "track",
+        "--onlymp3",
+    )
+    assert r.returncode == 1
+    assert "Failed to download https://soundcloud.com/one-thousand-and-one/this-track-does-not-exist" in r.stderr
+    assert "Downloaded 1 of 2 URLs" in r.stderr
+    assert_track(tmp_path, "track.mp3")
+
+
+def test_metadata_cache(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    for name in ("track1", "track2"):
+        r = call_scdl_with_auth(
+            "-l",
+            "https://soundcloud.com/one-thousand-and-one/test-track",
+            "--name-format",
+            name,
+            "--onlymp3",
+            "--cache-dir",
+            "cache",
+            "--debug",
+        )
+        assert r.returncode == 0
+        assert_track(tmp_path, f"{name}.mp3")
+    assert (tmp_path / "cache" / "metadata.sqlite3").exists()
+    assert "from metadata cache" in r.stderr
+
+
+def test_cached_validation(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    for name in ("track1", "track2"):
+        r = call_scdl_with_auth(
+            "-l",
+            "https://soundcloud.com/one-thousand-and-one/test-track",
+            "--name-format",
+            name,
+            "--onlymp3",
+            "--cache-dir",
+            "cache",
+            "--debug",
+        )
+        assert r.returncode == 0
+    assert "Skipping validation of client_id" in r.stderr
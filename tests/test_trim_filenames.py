@@ -0,0 +1,51 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from scdl.patches.trim_filenames import _ENCODING, _compile_trim
+
+INFO_DICTS = 100_000
+# trimming a filename takes under 10us here
+TRIM_BUDGET_US = 50
+
+
+def _trim_with_path(filename: str, max_length: int, mode: str) -> str:
+    """Trim each part of filename like the patch did before it was compiled"""
+
+    def trim_name(name: str) -> str:
+        if mode == "b":
+            return name.encode(_ENCODING)[:max_length].decode(_ENCODING, "ignore")
+        return name[:max_length]
+
+    return os.path.join(*map(trim_name, Path(filename).parts or "."))
+
+
+@pytest.mark.parametrize(("trim_file_name", "max_length", "mode"), [("240b", 240, "b"), ("100c", 100, "c")])
+def test_trim_speed(trim_file_name: str, max_length: int, mode: str) -> None:
+    infos = [
+        {
+            "title": f"тест трек {i} テストのタイトル 🎵 " * (1 + i % 8),
+            "uploader": "7x11x13-testing",
+            "playlist": f"плейлист {i % 50}",
+        }
+        for i in range(INFO_DICTS)
+    ]
+    filenames = [f"/home/user/Music/{info['playlist']}/{info['uploader']} - {info['title']}" for info in infos]
+    trim = _compile_trim(trim_file_name)
+    assert trim is not None
+
+    start = time.perf_counter()
+    trimmed = [trim(filename) for filename in filenames]
+    per_file_us = (time.perf_counter() - start) / INFO_DICTS * 1_000_000
+
+    assert trimmed == [_trim_with_path(filename, max_length, mode) for filename in filenames]
+    assert per_file_us < TRIM_BUDGET_US, f"{trim_file_name}: {per_file_us:.2f}us per filename"
+
+
+@pytest.mark.parametrize("filename", ["", ".", "./a", "a/", "//a", "/a//b", "a/./b", "a/../b", "/", "a" * 300])
+def test_trim_normalizes_like_path(filename: str) -> None:
+    trim = _compile_trim("10b")
+    assert trim is not None
+    assert trim(filename) == _trim_with_path(filename, 10, "b")
@@ -86,3 +86,18 @@ def test_reposts(tmp_path: Path) -> None:
     assert r.returncode == 0
     assert_track(tmp_path, "Wan Bushi - Eurodance Vibes (part 1+2+3).mp3", check_metadata=False)
     assert count_files(tmp_path) == 1
+
+
+def test_incremental(tmp_path: Path) -> None:
+    os.chdir(tmp_path)
+    args = ("-l", "https://soundcloud.com/one-thousand-and-one", "-t", "--onlymp3", "--cache-dir", "cache")
+    r = call_scdl_with_auth(*args, "--name-format=track", "--incremental")
+    assert r.returncode == 0
+    assert_track(tmp_path, "track.mp3")
+    r = call_scdl_with_auth(*args, "--name-format=track2", "--incremental")
+    assert r.returncode == 0
+    assert "Reached items listed in a previous run" in r.stderr
+    assert not (tmp_path / "track2.mp3").exists()
+    r = call_scdl_with_auth(*args, "--name-format=track2", "--incremental", "--full-rescan")
+    assert r.returncode == 0
+    assert_track(tmp_path, "track2.mp3")